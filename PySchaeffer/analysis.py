@@ -1,36 +1,82 @@
 #!/usr/bin/python3
-import math
+import cmath,math,operator
+from functools import lru_cache
+from PySchaeffer.backend import accelerated
+from PySchaeffer.base import get_sampling_rate,as_sound,sound_blocks
 
 # DISCRETE COSINE TRANSFORM
 ###########################
 # https://en.wikipedia.org/wiki/Discrete_cosine_transform
 
+# Computed in O(N.log(N)) with the FFT (see below) :
+# https://en.wikipedia.org/wiki/Discrete_cosine_transform#Computation
+# Scaling conventions :
+#   DCT-I   : X[k] = x[0]/2+(-1)**k*x[N-1]/2+sum(x[n]*cos(pi/(N-1)*n*k)) for 0<n<N-1
+#   DCT-II  : X[k] = sum(x[n]*cos(pi/N*(n+1/2)*k)) for 0<=n<N
+#   DCT-III : X[k] = x[0]/2+sum(x[n]*cos(pi/N*n*(k+1/2))) for 0<n<N
+
+@lru_cache(maxsize=32)
+def dct_twiddles(N):
+  """
+  Returns :
+  two lists (cos(pi*k/(2N)) and sin(pi*k/(2N)) for 0<=k<N)
+  """
+  return ([math.cos(math.pi*k/(2*N)) for k in range(N)],
+          [math.sin(math.pi*k/(2*N)) for k in range(N)])
+
 def analyse_dct_1(x):
   N = len(x)
-  X = [0]*N
-  for k in range(N):
-    X[k] = x[0]/2
-    for n in range(1,N-1):
-      X[k] += x[n]*math.cos(math.pi/(N-1)*n*k)
-    X[k] += (-1)**k*x[N-1]/2
-  return X
+  if N<=1:
+    return [float(value) for value in x]
+  # FFT of the even extension x[0],...,x[N-1],x[N-2],...,x[1]
+  x = list(x)
+  X = analyse_rfft(x+x[N-2:0:-1])
+  return [value.real/2 for value in X]
 
 def analyse_dct_2(x):
   N = len(x)
-  X = [0]*N
-  for k in range(N):
-    for n in range(N):
-      X[k] += x[n]*math.cos(math.pi/N*(n+1/2)*k)
-  return X
+  if N==0:
+    return []
+  # Makhoul : FFT of even samples followed by reversed odd samples
+  v = list(x[0::2])+list(x[1::2])[::-1]
+  V = analyse_rfft(v)
+  # second half of the spectrum : conjugated first half
+  V.extend(value.conjugate() for value in V[(N+1)//2-1:0:-1])
+  cos_table,sin_table = dct_twiddles(N)
+  # X[k] = real part of V[k]*exp(-i.pi.k/(2N))
+  return [value.real*c+value.imag*s for value,c,s in zip(V,cos_table,sin_table)]
 
 def analyse_dct_3(x):
   N = len(x)
-  X = [0]*N
-  for k in range(N):
-    X[k] = x[0]/2
-    for n in range(1,N):
-      X[k] += x[n]*math.cos(math.pi/N*n*(k+1/2))
-  return X
+  if N==0:
+    return []
+  # inverse of Makhoul's scheme (DCT-III is the inverse DCT-II up to N/2)
+  cos_table,sin_table = dct_twiddles(N)
+  V = [0j]*(N//2+1)
+  for k in range(N//2+1):
+    # (x[k]-i.x[N-k])*exp(i.pi.k/(2N)), x[N] being 0
+    re = x[k]
+    im = -x[N-k] if k>0 else 0.0
+    V[k] = complex(re*cos_table[k]-im*sin_table[k],re*sin_table[k]+im*cos_table[k])/2
+  v = analyse_inverse_rfft(V,N)
+  X = [0.0]*N
+  X[0::2] = v[:(N+1)//2]
+  X[1::2] = v[:(N+1)//2-1:-1]
+  return [value*N for value in X]
+
+def analyse_inverse_dct_1(X):
+  N = len(X)
+  if N<=1:
+    return [float(value) for value in X]
+  return [value*2/(N-1) for value in analyse_dct_1(X)]
+
+def analyse_inverse_dct_2(X):
+  N = len(X)
+  return [value*2/N for value in analyse_dct_3(X)]
+
+def analyse_inverse_dct_3(X):
+  N = len(X)
+  return [value*2/N for value in analyse_dct_2(X)]
 
 # FAST FOURIER TRANSFORM
 ########################
@@ -58,71 +104,473 @@ def analyse_phase(X):
     phase_X[i] = math.atan2(X[i].imag,X[i].real)
   return phase_X
 
+class FFTPlan:
+  """
+  Precomputed tables for FFTs of size n (see get_fft_plan) :
+    n power of 2 : bit-reversal permutation and twiddle factors
+      of each stage (iterative Cooley-Tukey)
+    other sizes : chirp and its spectrum (Bluestein algorithm)
+      https://en.wikipedia.org/wiki/Chirp_Z-transform#Bluestein's_algorithm
+  """
+  def __init__(self,n):
+    self.n = n
+    self.is_power_of_2 = n>0 and n&(n-1)==0
+    # exp(-2i.pi.k/n) for k<n/2
+    self.twiddles = [cmath.exp(-2j*math.pi*k/n) for k in range(n//2)]
+    if self.is_power_of_2:
+      log2_n = n.bit_length()-1
+      bit_reversal = [0]*n
+      for k in range(1,n):
+        bit_reversal[k] = (bit_reversal[k>>1]>>1)|((k&1)<<(log2_n-1))
+      self.bit_reversal = bit_reversal
+      # stage of size m : exp(-2i.pi.j/m) for j<m/2
+      self.stages_twiddles = []
+      m = 2
+      while m<=n:
+        self.stages_twiddles.append(self.twiddles[::n//m])
+        m *= 2
+    else:
+      # x[k]*chirp[k] convolved with conj(chirp), with a power of 2 FFT
+      m = 1<<(2*n-2).bit_length()
+      self.chirp = [cmath.exp(-1j*math.pi*((k*k)%(2*n))/n) for k in range(n)]
+      b = [0j]*m
+      b[0] = 1+0j
+      for k in range(1,n):
+        b[k] = b[m-k] = self.chirp[k].conjugate()
+      self.convolution_plan = get_fft_plan(m)
+      self.chirp_fft = self.convolution_plan.fft(b)
+
+  def fft(self,a):
+    """
+    Parameters :
+    a : list of n complex values
+    Returns :
+    list A of length n, DFT (Discrete Fourier Transform) of a.
+    """
+    n = self.n
+    assert len(a)==n
+    if not self.is_power_of_2:
+      x = list(map(operator.mul,a,self.chirp))
+      x.extend([0j]*(self.convolution_plan.n-n))
+      X = list(map(operator.mul,self.convolution_plan.fft(x),self.chirp_fft))
+      return list(map(operator.mul,self.convolution_plan.inverse_fft(X)[:n],self.chirp))
+    # Bit reverse copy
+    A = [complex(a[k]) for k in self.bit_reversal]
+    # iterative FFT, butterflies by slices
+    h = 1
+    for twiddles in self.stages_twiddles:
+      m = 2*h
+      if h<n//m:
+        # small stage : one twiddle for strided slices over all blocks
+        for j in range(h):
+          u = A[j::m]
+          t = A[j+h::m]
+          if j>0:
+            t = list(map(twiddles[j].__mul__,t))
+          A[j::m] = list(map(operator.add,u,t))
+          A[j+h::m] = list(map(operator.sub,u,t))
+      else:
+        # large stage : block by block
+        for k in range(0,n,m):
+          u = A[k:k+h]
+          t = list(map(operator.mul,twiddles,A[k+h:k+m]))
+          A[k:k+h] = map(operator.add,u,t)
+          A[k+h:k+m] = map(operator.sub,u,t)
+      h = m
+    return A
+
+  def inverse_fft(self,A):
+    a = self.fft(A)
+    n = self.n
+    # a[-i]/n
+    return [a[0]/n]+[value/n for value in a[:0:-1]]
+
+  def rfft(self,x):
+    """
+    Parameters :
+    x : list of n real values
+    Returns :
+    list of n//2+1 complex values, first half of the DFT of x
+    (the second half being conjugated)
+    """
+    n = self.n
+    if n%2==1:
+      return self.fft(x)[:n//2+1]
+    # even and odd samples packed as a complex signal of size n/2
+    N = n//2
+    Z = get_fft_plan(N).fft(list(map(complex,x[0::2],x[1::2])))
+    Z.append(Z[0])
+    X = [0j]*(N+1)
+    twiddles = self.twiddles
+    for k in range(N):
+      z = Z[k]
+      z_conj = Z[N-k].conjugate()
+      X[k] = ((z+z_conj)-1j*twiddles[k]*(z-z_conj))*0.5
+    X[N] = (Z[0].real-Z[0].imag)+0j
+    return X
+
+  def inverse_rfft(self,X):
+    """
+    Parameters :
+    X : list of n//2+1 complex values (see rfft)
+    Returns :
+    list of n real values
+    """
+    n = self.n
+    N = n//2
+    if n%2==1:
+      full = list(X)+[value.conjugate() for value in X[N:0:-1]]
+      return [value.real for value in self.inverse_fft(full)]
+    Z = [0j]*N
+    twiddles = self.twiddles
+    for k in range(N):
+      x = X[k]
+      x_conj = X[N-k].conjugate()
+      Z[k] = ((x+x_conj)+1j*(x-x_conj)*twiddles[k].conjugate())*0.5
+    z = get_fft_plan(N).inverse_fft(Z)
+    x = [0.0]*n
+    x[0::2] = [value.real for value in z]
+    x[1::2] = [value.imag for value in z]
+    return x
+
+@lru_cache(maxsize=32)
+def get_fft_plan(n):
+  """
+  Returns :
+  the FFTPlan of size n (the 32 last used plans are kept)
+  """
+  return FFTPlan(n)
+
+@accelerated
 def analyse_fft(a):
   """
   Parameters :
-  a : list a of n complex values where n is a power of 2.
+  a : list a of n complex values (any n, faster if n is a power of 2).
   Returns :
   list A of length n, DFT (Discrete Fourier Transform) of a.
   """
-  n = len(a)
-  log2_n = 0
-  while 2**log2_n<n:
-    log2_n += 1
-  assert 2**log2_n==n
-  # Bit reverse copy
-  A = [0]*n
-  for k in range(n):
-    value = a[k]
-    reversed_k = 0
-    for i in range(log2_n):
-      reversed_k = (reversed_k*2)+k%2
-      k //= 2
-    A[reversed_k] = complex(value)
-  # iterative FFT
-  for s in range(1,log2_n+1):
-    m = 2**s
-    phi = -2*math.pi/m
-    omega_m = math.cos(phi)+math.sin(phi)*1j
-    for k in range(0,n,m):
-      omega = 1
-      for j in range(m//2):
-        t = omega*A[k+j+m//2]
-        u = A[k+j]
-        A[k+j] = u+t
-        A[k+j+m//2] = u-t
-        omega = omega*omega_m
-  return A
+  if len(a)==0:
+    return []
+  return get_fft_plan(len(a)).fft(a)
 
+@accelerated
 def analyse_inverse_fft(A):
-  N = len(A)
-  a = analyse_fft(A)
-  a2 = [0]*N
-  for i in range(N):
-    a2[i] = a[-i]/N
-  return a2
+  if len(A)==0:
+    return []
+  return get_fft_plan(len(A)).inverse_fft(A)
+
+@accelerated
+def analyse_rfft(x):
+  """
+  Parameters :
+  x : list of n real values (a sound)
+  Returns :
+  list of n//2+1 complex values, first half of the DFT of x
+  (about twice faster than analyse_fft for even n)
+  """
+  if len(x)==0:
+    return []
+  return get_fft_plan(len(x)).rfft(x)
+
+@accelerated
+def analyse_inverse_rfft(X,n=None):
+  """
+  Parameters :
+  X : list of n//2+1 complex values (see analyse_rfft)
+  n : length of the output (2*(len(X)-1) if None)
+  Returns :
+  list of n real values
+  """
+  if n is None:
+    n = 2*(len(X)-1)
+  if n<=0:
+    return []
+  return get_fft_plan(n).inverse_rfft(X)
+
+# SHORT-TIME FOURIER TRANSFORM
+##############################
+# https://en.wikipedia.org/wiki/Short-time_Fourier_transform
+# Frame t is centred on sample t*hop (the sound is preceded by
+# window_size//2 zeros), and frames are produced as soon as enough samples
+# have been received, so that long files can be analysed block by block.
+# The inverse is a weighted overlap-add (the synthesis window is the analysis
+# window, normalised by the sum of the squared overlapping windows).
+
+@lru_cache(maxsize=16)
+def analysis_window(name,size):
+  """
+  Parameters :
+  name : 'hann', 'hamming', 'blackman' or 'rectangular'
+  size : number of samples
+  Returns :
+  tuple of size floats (periodic window, suited to overlap-add)
+  """
+  if name=='rectangular':
+    return (1.0,)*size
+  coefficients = {
+    'hann': (0.5,0.5),
+    'hamming': (0.54,0.46),
+    'blackman': (0.42,0.5,0.08)
+  }[name]
+  window = []
+  for n in range(size):
+    value = 0.0
+    for k in range(len(coefficients)):
+      value += (-1)**k*coefficients[k]*math.cos(2*math.pi*k*n/size)
+    window.append(value)
+  return tuple(window)
+
+def analyse_stft_blocks(blocks,n_fft=2048,hop=512,window='hann',window_size=None):
+  """
+  Parameters :
+  blocks : an iterable of blocks of samples (e.g. a WavReader, see io)
+  n_fft : size of the FFT (frames are zero-padded to n_fft)
+  hop : number of samples between two frames
+  window : name of the window (see analysis_window)
+  window_size : number of samples per frame (n_fft if None)
+  Returns :
+  a generator of frames (spectrum,modulus,phase), each being a list of
+  n_fft//2+1 values (complex, positive float, float in [-pi,pi])
+  """
+  if window_size is None:
+    window_size = n_fft
+  if not 0<hop<=window_size<=n_fft:
+    raise ValueError("0 < hop <= window_size <= n_fft is required")
+  window = analysis_window(window,window_size)
+  padding = [0.0]*(n_fft-window_size)
+  buffer = [0.0]*(window_size//2)
+  n_samples = 0
+  i_centre = 0
+  def frame():
+    spectrum = analyse_rfft(list(map(operator.mul,buffer[:window_size],window))+padding)
+    return spectrum,list(map(abs,spectrum)),list(map(cmath.phase,spectrum))
+  for block in blocks:
+    buffer.extend(block)
+    n_samples += len(block)
+    while len(buffer)>=window_size:
+      yield frame()
+      del buffer[:hop]
+      i_centre += hop
+  # zero-padded frames while the window still overlaps the sound
+  while i_centre-window_size//2<n_samples:
+    buffer.extend([0.0]*(window_size-len(buffer)))
+    yield frame()
+    del buffer[:hop]
+    i_centre += hop
+
+def analyse_stft(sound,n_fft=2048,hop=512,window='hann',window_size=None):
+  """
+  Parameters :
+  sound : a list of float
+  (see analyse_stft_blocks for the other parameters)
+  Returns :
+  a generator of frames (spectrum,modulus,phase)
+  """
+  return analyse_stft_blocks(sound_blocks(sound,max(hop,4096)),n_fft,hop,window,window_size)
+
+def analyse_inverse_stft(frames,n_fft=2048,hop=512,window='hann',window_size=None,n_samples=None):
+  """
+  Parameters :
+  frames : an iterable of spectra (lists of n_fft//2+1 complex values), or
+    of (spectrum,modulus,phase) tuples as produced by analyse_stft
+  n_samples : length of the resynthesised sound (unlimited if None)
+  (the other parameters must be the ones used for the analysis)
+  Returns :
+  a generator of compact sounds (blocks of at most hop samples)
+  """
+  if window_size is None:
+    window_size = n_fft
+  if not 0<hop<=window_size<=n_fft:
+    raise ValueError("0 < hop <= window_size <= n_fft is required")
+  window = analysis_window(window,window_size)
+  squared_window = [value*value for value in window]
+  samples = [0.0]*window_size
+  weights = [0.0]*window_size
+  n_skipped = window_size//2
+  if n_samples is None:
+    n_samples = math.inf
+  def normalised(n):
+    return [sample/weight if weight>1e-10 else 0.0 for sample,weight in zip(samples[:n],weights[:n])]
+  def trimmed(block):
+    nonlocal n_skipped,n_samples
+    n_skipped,block = max(0,n_skipped-len(block)),block[n_skipped:]
+    block = block[:n_samples] if n_samples<len(block) else block
+    n_samples -= len(block)
+    return as_sound(block)
+  for spectrum in frames:
+    if isinstance(spectrum,tuple):
+      spectrum = spectrum[0]
+    frame = analyse_inverse_rfft(spectrum,n_fft)
+    samples[:] = map(operator.add,samples,map(operator.mul,frame,window))
+    weights[:] = map(operator.add,weights,squared_window)
+    block = trimmed(normalised(hop))
+    del samples[:hop]
+    del weights[:hop]
+    samples.extend([0.0]*hop)
+    weights.extend([0.0]*hop)
+    if len(block)>0:
+      yield block
+    if n_samples==0:
+      return
+  block = trimmed(normalised(window_size-hop))
+  if len(block)>0:
+    yield block
 
 # FILTER RESPONSE
 #################
+# Polynomials are evaluated with Horner's method over the whole frequency
+# grid at once (one pass per coefficient).
+# Filters are given as (b,a) tuples (see effects.design_low_pass...) or as
+# lists of (b,a) sections applied in cascade.
+# Group delay of a polynomial P(z) = sum(p[k]*z**-k) :
+#   real part of sum(k*p[k]*z**-k)/P(z)
+# https://ccrma.stanford.edu/~jos/fp/Numerical_Computation_Group_Delay.html
+
+def evaluate_polynomial(coefficients,z_values):
+  """
+  Parameters :
+  coefficients : list of float (coefficient of z**k at index k)
+  z_values : list of complex
+  Returns :
+  list of complex, the polynomial evaluated at each value of z_values
+  """
+  if len(coefficients)==0:
+    return [0j]*len(z_values)
+  values = [complex(coefficients[-1])]*len(z_values)
+  for coefficient in reversed(coefficients[:-1]):
+    values = list(map(complex(coefficient).__add__,map(operator.mul,values,z_values)))
+  return values
 
 def filter_response(b,a,n_points):
-  response = [0]*n_points
-  for k in range(n_points):
-    omega = k/n_points*math.pi
-    z = math.cos(omega)+math.sin(omega)*1j
-    b_value = 0
-    for i in range(len(b)):
-      b_value += b[i]*(z**i)
-    a_value = 0
-    for i in range(len(a)):
-      a_value += a[i]*(z**i)
-    response[k] = b_value/a_value
+  """
+  Parameters :
+  b,a : IIR coefficients
+  n_points : number of frequencies, evenly spaced from 0 to pi (excluded)
+  Returns :
+  list of complex, b(z)/a(z) with z = exp(i.omega)
+  """
+  z_values = [cmath.exp(1j*k/n_points*math.pi) for k in range(n_points)]
+  return list(map(operator.truediv,evaluate_polynomial(b,z_values),evaluate_polynomial(a,z_values)))
+
+def frequency_grid(n_points=512,f_min=20,f_max=None,is_log=True):
+  """
+  Parameters :
+  n_points : number of frequencies
+  f_min,f_max : bounds (in Hz, f_max is the Nyquist frequency if None)
+  is_log : log-spaced (True) or evenly spaced (False) frequencies
+  Returns :
+  list of n_points frequencies (in Hz)
+  """
+  if f_max is None:
+    f_max = get_sampling_rate()/2
+  if n_points==1:
+    return [f_min]
+  if is_log:
+    ratio = (f_max/f_min)**(1/(n_points-1))
+    return [f_min*ratio**k for k in range(n_points)]
+  step = (f_max-f_min)/(n_points-1)
+  return [f_min+k*step for k in range(n_points)]
+
+def filter_sections(filters):
+  """
+  Returns :
+  list of (b,a) sections, filters being a (b,a) tuple or a list of sections
+  """
+  b = filters[0]
+  if len(b)>0 and not isinstance(b[0],(list,tuple)):
+    return [filters]
+  return list(filters)
+
+def filter_frequency_response(filters,frequencies):
+  """
+  Parameters :
+  filters : (b,a) tuple or list of (b,a) sections in cascade
+  frequencies : list of frequencies (in Hz, see frequency_grid)
+  Returns :
+  list of complex, H(z) with z**-1 = exp(-2i.pi.f/sampling_rate)
+  """
+  sampling_rate = get_sampling_rate()
+  z_values = [cmath.exp(-2j*math.pi*f/sampling_rate) for f in frequencies]
+  response = [1+0j]*len(z_values)
+  for b,a in filter_sections(filters):
+    response = list(map(operator.mul,response,evaluate_polynomial(b,z_values)))
+    response = list(map(operator.truediv,response,evaluate_polynomial(a,z_values)))
   return response
 
+def analyse_filter(filters,frequencies):
+  """
+  Parameters :
+  filters : (b,a) tuple or list of (b,a) sections in cascade
+  frequencies : list of frequencies (in Hz, see frequency_grid)
+  Returns :
+  a tuple (magnitude,phase,group_delay) of lists :
+    magnitude in dB, phase in [-pi,pi] and group delay in samples
+  """
+  sampling_rate = get_sampling_rate()
+  z_values = [cmath.exp(-2j*math.pi*f/sampling_rate) for f in frequencies]
+  response = [1+0j]*len(z_values)
+  group_delay = [0.0]*len(z_values)
+  for b,a in filter_sections(filters):
+    for coefficients,sign in ((b,1),(a,-1)):
+      values = evaluate_polynomial(coefficients,z_values)
+      ramped = evaluate_polynomial([k*c for k,c in enumerate(coefficients)],z_values)
+      if sign==1:
+        response = list(map(operator.mul,response,values))
+      else:
+        response = list(map(operator.truediv,response,values))
+      group_delay = [delay+sign*(r/v).real if v!=0 else delay
+                     for delay,r,v in zip(group_delay,ramped,values)]
+  magnitude = [20*math.log10(abs(h)) if h!=0 else -math.inf for h in response]
+  phase = [cmath.phase(h) for h in response]
+  return magnitude,phase,group_delay
 
 # AMPLITUDE ANALYSIS
 ####################
 
+class EnvelopeDetector:
+  """
+  Envelope detector keeping its state between successive blocks
+  (see detect_envelope)
+  """
+  def __init__(self,attack=5,release=-1):
+    """
+    Parameters :
+      attack : an attack time (in ms)
+      release : a release time (in ms)
+        (same as attack if not specified)
+    """
+    sampling_rate = get_sampling_rate()
+    if release==-1:
+      release = attack
+    self.attack_gain = math.exp(-1/(sampling_rate*attack/1000))
+    self.release_gain = math.exp(-1/(sampling_rate*release/1000))
+    # smoothed energy of the last sample (None before the first block)
+    self.energy = None
+
+  def process(self,block):
+    """
+    Parameters :
+      block : a list of float
+    Returns :
+      a compact sound, the envelope of block
+    """
+    attack_gain = self.attack_gain
+    release_gain = self.release_gain
+    previous = self.energy
+    envelope = []
+    for sample in block:
+      energy = sample**2
+      if previous is None:
+        energy = 0
+      elif energy>previous:
+        energy = attack_gain*previous+(1-attack_gain)*energy
+      else:
+        energy = release_gain*previous+(1-release_gain)*energy
+      envelope.append(energy**0.5)
+      previous = energy
+    self.energy = previous
+    return as_sound(envelope)
+
 def detect_envelope(sound,attack=5,release=-1):
   """
   Based on :
@@ -135,20 +583,147 @@ def detect_envelope(sound,attack=5,release=-1):
     release : a release time (in ms)
       (same as attack if not specified)
   Returns :
-    a list of float
-  """
-  sampling_rate = 44100
-  if release==-1:
-    release = attack
-  attack_gain = math.exp(-1/(sampling_rate*attack/1000))
-  release_gain = math.exp(-1/(sampling_rate*release/1000))
-  energy = [sound[i]**2 for i in range(len(sound))]
-  energy[0] = 0
-  for i in range(1,len(energy)):
-    if energy[i]>energy[i-1]:
-      energy[i] = attack_gain*energy[i-1]+(1-attack_gain)*energy[i]
-    else:
-      energy[i] = release_gain*energy[i-1]+(1-release_gain)*energy[i]
-  for i in range(len(energy)):
-    energy[i] = energy[i]**0.5
-  return energy
+    a compact sound
+  """
+  return EnvelopeDetector(attack,release).process(sound)
+
+# LEVEL METERING
+################
+# Loudness as specified in ITU-R BS.1770-4 (mono) :
+# https://www.itu.int/rec/R-REC-BS.1770
+#   K-weighting : high shelf followed by a high pass, designed for any
+#   sampling rate from the analog prototypes (as in pyloudnorm)
+#   gating blocks of 400ms every 100ms, absolute gate at -70 LUFS,
+#   relative gate 10 LU below the loudness of the blocks above -70 LUFS
+
+def design_k_weighting():
+  """
+  Returns :
+    two lists of 5 floats (b0,b1,b2,a1,a2), the high shelf and the high pass
+    (a0 being 1)
+  """
+  sampling_rate = get_sampling_rate()
+  # high shelf
+  f0,G,Q = 1681.974450955533,3.999843853973347,0.7071752369554196
+  K = math.tan(math.pi*f0/sampling_rate)
+  Vh = 10**(G/20)
+  Vb = Vh**0.4996667741545416
+  a0 = 1+K/Q+K*K
+  shelf = [(Vh+Vb*K/Q+K*K)/a0,2*(K*K-Vh)/a0,(Vh-Vb*K/Q+K*K)/a0,
+           2*(K*K-1)/a0,(1-K/Q+K*K)/a0]
+  # high pass
+  f0,Q = 38.13547087602444,0.5003270373238773
+  K = math.tan(math.pi*f0/sampling_rate)
+  a0 = 1+K/Q+K*K
+  high_pass = [1.0,-2.0,1.0,2*(K*K-1)/a0,(1-K/Q+K*K)/a0]
+  return shelf,high_pass
+
+class LevelMeter:
+  """
+  Peak, RMS, crest factor and integrated loudness (LUFS) measured
+  block by block, in a single pass
+  """
+  def __init__(self):
+    self.n_samples = 0
+    self.peak = 0.0
+    self.energy = 0.0
+    self.filters = design_k_weighting()
+    # transposed direct form II states of both K-weighting sections
+    self.states = [0.0]*4
+    # K-weighted energy of the 100ms steps
+    self.step_size = round(get_sampling_rate()/10)
+    self.step_energies = []
+    self.step_energy = 0.0
+    self.step_count = 0
+
+  def k_weight(self,block):
+    (b0,b1,b2,a1,a2),(c0,c1,c2,d1,d2) = self.filters
+    s1,s2,t1,t2 = self.states
+    weighted = []
+    for x in block:
+      y = b0*x+s1
+      s1 = b1*x-a1*y+s2
+      s2 = b2*x-a2*y
+      z = c0*y+t1
+      t1 = c1*y-d1*z+t2
+      t2 = c2*y-d2*z
+      weighted.append(z)
+    self.states = [s1,s2,t1,t2]
+    return weighted
+
+  def process(self,block):
+    """
+    Parameters :
+      block : a list of float
+    """
+    if len(block)==0:
+      return
+    self.n_samples += len(block)
+    self.peak = max(self.peak,max(map(abs,block)))
+    self.energy += math.fsum(map(operator.mul,block,block))
+    weighted = self.k_weight(block)
+    i_start = 0
+    while i_start<len(weighted):
+      n = min(self.step_size-self.step_count,len(weighted)-i_start)
+      step = weighted[i_start:i_start+n]
+      self.step_energy += math.fsum(map(operator.mul,step,step))
+      self.step_count += n
+      i_start += n
+      if self.step_count==self.step_size:
+        self.step_energies.append(self.step_energy)
+        self.step_energy = 0.0
+        self.step_count = 0
+
+  def rms(self):
+    if self.n_samples==0:
+      return 0.0
+    return (self.energy/self.n_samples)**0.5
+
+  def crest_factor(self):
+    """
+    Returns :
+      peak/RMS ratio (inf for silence)
+    """
+    rms = self.rms()
+    return self.peak/rms if rms>0 else math.inf
+
+  def integrated_loudness(self):
+    """
+    Returns :
+      gated loudness in LUFS (-inf if shorter than 400ms or too quiet)
+    """
+    steps = self.step_energies
+    block_size = 4*self.step_size
+    powers = [sum(steps[i:i+4])/block_size for i in range(len(steps)-3)]
+    def loudness(power):
+      return -0.691+10*math.log10(power) if power>0 else -math.inf
+    powers = [power for power in powers if loudness(power)>-70]
+    if len(powers)==0:
+      return -math.inf
+    relative_gate = loudness(sum(powers)/len(powers))-10
+    powers = [power for power in powers if loudness(power)>relative_gate]
+    return loudness(sum(powers)/len(powers))
+
+  def levels(self):
+    """
+    Returns :
+      a dictionary with peak, rms, crest_factor and loudness (LUFS)
+    """
+    return {
+      'peak': self.peak,
+      'rms': self.rms(),
+      'crest_factor': self.crest_factor(),
+      'loudness': self.integrated_loudness()
+    }
+
+def measure_levels(blocks):
+  """
+  Parameters :
+    blocks : an iterable of blocks (e.g. a WavReader, see io)
+  Returns :
+    a dictionary with peak, rms, crest_factor and loudness (LUFS)
+  """
+  meter = LevelMeter()
+  for block in blocks:
+    meter.process(block)
+  return meter.levels()
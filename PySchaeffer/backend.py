@@ -0,0 +1,55 @@
+#!/usr/bin/python3
+import functools,importlib,os
+
+# BACKEND SELECTION
+###################
+# Hot functions can be replaced by vectorized NumPy versions
+# (same name in PySchaeffer.numpy_backend).
+# PYSCHAEFFER_BACKEND environment variable :
+#   'python' : pure Python (no library needed)
+#   'numpy' : NumPy (fails if NumPy is not installed)
+#   'auto' (or not set) : NumPy if it can be imported, pure Python otherwise
+
+backend = 'python'
+implementations = None
+
+def set_backend(name='auto'):
+  """
+  Parameters
+  ----------
+  name : 'python', 'numpy' or 'auto'
+  Returns
+  -------
+  the selected backend name ('python' or 'numpy')
+  """
+  global backend,implementations
+  assert name in ['python','numpy','auto'], f'Unknown backend {name}'
+  backend,implementations = 'python',None
+  if name!='python':
+    try:
+      implementations = importlib.import_module('PySchaeffer.numpy_backend')
+      backend = 'numpy'
+    except ImportError:
+      if name=='numpy':
+        raise
+  return backend
+
+def get_backend():
+  return backend
+
+def accelerated(function):
+  """
+  Decorator : calls are dispatched to the NumPy version of function
+  when the NumPy backend is selected.
+  The pure Python version stays available as function.python
+  """
+  name = function.__name__
+  @functools.wraps(function)
+  def dispatch(*args,**kwargs):
+    if implementations is not None:
+      return getattr(implementations,name)(*args,**kwargs)
+    return function(*args,**kwargs)
+  dispatch.python = function
+  return dispatch
+
+set_backend(os.environ.get('PYSCHAEFFER_BACKEND','auto'))
@@ -1,10 +1,115 @@
-import math
+import bisect,itertools,math,operator
+from contextlib import contextmanager
+from array import array
+from fractions import Fraction
+from functools import lru_cache
+
+# SAMPLING RATE
+###############
+# Library-wide sampling rate (44100Hz by default), used by every function.
+# A lower rate can be used for quick previews, see draft_mode.
+
+sampling_rates = {
+  'rendering': 44100, # used by generators, effects, ...
+  'output': None,     # used when writing files (rendering rate if None)
+}
+
+def get_sampling_rate():
+  return sampling_rates['rendering']
+
+def get_output_sampling_rate():
+  if sampling_rates['output'] is None:
+    return sampling_rates['rendering']
+  return sampling_rates['output']
+
+def set_sampling_rate(sampling_rate,output_sampling_rate=None):
+  """
+  Parameters
+  ----------
+  sampling_rate : rendering sampling rate (in Hz)
+  output_sampling_rate : sampling rate of written files
+    (same as sampling_rate if None, upsampled when writing otherwise)
+  """
+  sampling_rates['rendering'] = sampling_rate
+  sampling_rates['output'] = output_sampling_rate
+
+@contextmanager
+def use_sampling_rate(sampling_rate,output_sampling_rate=None):
+  """
+  Context manager, see set_sampling_rate :
+    with use_sampling_rate(48000):
+      sound = generate_sine(1000,440)
+  """
+  previous_rates = dict(sampling_rates)
+  set_sampling_rate(sampling_rate,output_sampling_rate)
+  try:
+    yield
+  finally:
+    sampling_rates.update(previous_rates)
+
+def draft_mode(sampling_rate=22050):
+  """
+  Context manager : quick rendering at a lower sampling rate
+  (11025 or 22050Hz), written files are upsampled to the current rate
+  and read files are resampled to the draft rate
+    with draft_mode():
+      write_wav('preview.wav',render_piece())
+  """
+  return use_sampling_rate(sampling_rate,get_output_sampling_rate())
+
+# SOUND BUFFERS
+###############
+# Sounds are stored in compact arrays of double (8 bytes per sample)
+# rather than lists of float (about 32 bytes per sample).
+# sound_typecode can be set to 'f' (4 bytes per sample) to save memory.
+# Lists of float are still accepted everywhere as input.
+
+sound_typecode = 'd'
+
+def create_sound(n_samples=0,value=0.0):
+  """
+  Parameters
+  ----------
+  n_samples : number of samples
+  value : a float
+  Returns
+  -------
+  a compact sound (array of float)
+  """
+  return array(sound_typecode,[value])*n_samples
+
+def as_sound(values):
+  """
+  Parameters
+  ----------
+  values : an iterable of float (a list, a generator, ...)
+  Returns
+  -------
+  a compact sound (array of float), values itself if already compact
+  """
+  if isinstance(values,array) and values.typecode==sound_typecode:
+    return values
+  return array(sound_typecode,values)
+
+def sound_blocks(sound,block_size=4096):
+  """
+  Parameters
+  ----------
+  sound : a list of float
+  block_size : number of samples per block
+  Returns
+  -------
+  a generator of consecutive blocks (slices of sound), the last one
+  may be shorter
+  """
+  for i_start in range(0,len(sound),block_size):
+    yield sound[i_start:i_start+block_size]
 
 def add_sound(soundtrack,sound,time=0,in_place=True):
   """
   Parameters
   ----------
-  soundtrack : list of float
+  soundtrack : list of float (or compact sound)
   sound : list of float to be added to soundtrack (zero-padding if needed)
   time : time stamp (in ms) when it should be added
   in_place : returned list (soundtrack_out) and soundtrack are the same
@@ -16,15 +121,81 @@ def add_sound(soundtrack,sound,time=0,in_place=True):
     soundtrack_out = soundtrack[:]
   else:
     soundtrack_out = soundtrack
-  sampling_rate = 44100
+  sampling_rate = get_sampling_rate()
   i_start = int(time*sampling_rate/1000)
   n_samples = max(len(soundtrack),i_start+len(sound))
   if n_samples>len(soundtrack):
     soundtrack_out.extend([0]*(n_samples-len(soundtrack)))
-  for i in range(len(sound)):
-    soundtrack_out[i_start+i] += sound[i]
+  i_end = i_start+len(sound)
+  summed = map(operator.add,soundtrack_out[i_start:i_end],sound)
+  if isinstance(soundtrack_out,array):
+    summed = array(soundtrack_out.typecode,summed)
+  soundtrack_out[i_start:i_end] = summed
   return soundtrack_out
 
+class Mixer:
+  """
+  Timeline of sounds : placements are only stored (sparse),
+  they are summed into a preallocated output when rendering
+  Usage :
+    mixer = Mixer()
+    mixer.add(sound1,0)
+    mixer.add(sound2,1000,0.5)
+    soundtrack = mixer.render()
+  """
+  def __init__(self):
+    self.placements = [] # tuples (i_start,sound,gain)
+    self.n_samples = 0
+
+  def __len__(self):
+    return self.n_samples
+
+  def add(self,sound,time=0,gain=1.0):
+    """
+    Parameters
+    ----------
+    sound : list of float (not copied, should not be modified before rendering)
+    time : time stamp (in ms) when it should be added
+    gain : amplification factor
+    """
+    sampling_rate = get_sampling_rate()
+    i_start = int(time*sampling_rate/1000)
+    self.placements.append((i_start,sound,float(gain)))
+    self.n_samples = max(self.n_samples,i_start+len(sound))
+
+  def render(self,time=0,duration=None):
+    """
+    Parameters
+    ----------
+    time : start (in ms) of the rendered window
+    duration : duration (in ms) of the rendered window,
+      until the end of the last sound if None
+    Returns
+    -------
+    a compact sound
+    """
+    sampling_rate = get_sampling_rate()
+    i_window_start = int(time*sampling_rate/1000)
+    if duration is None:
+      i_window_end = max(i_window_start,self.n_samples)
+    else:
+      i_window_end = i_window_start+int(duration*sampling_rate/1000)
+    soundtrack = create_sound(i_window_end-i_window_start)
+    for i_start,sound,gain in self.placements:
+      # overlap between the sound and the window
+      i_first = max(i_start,i_window_start)
+      i_last = min(i_start+len(sound),i_window_end)
+      if i_first>=i_last:
+        continue
+      part = sound[i_first-i_start:i_last-i_start]
+      if gain!=1.0:
+        part = map(gain.__mul__,part)
+      i_first -= i_window_start
+      i_last -= i_window_start
+      soundtrack[i_first:i_last] = array(soundtrack.typecode,
+        map(operator.add,soundtrack[i_first:i_last],part))
+    return soundtrack
+
 def value_at_sample(sound,i_sample,is_cycling=False):
   """
   Parameters :
@@ -66,15 +237,389 @@ def interpolate_at_sample(sound,sample,is_cycling=False,method='lanczos',a=3):
   delta_sample = sample-left_sample
   if method=='nearest':
     if abs(delta_sample)<0.5:
-      return value_at_sample(sound,left_sample)
+      return value_at_sample(sound,left_sample,is_cycling)
     else:
-      return value_at_sample(sound,left_sample+1)
+      return value_at_sample(sound,left_sample+1,is_cycling)
   elif method=='linear':
-    return (1-delta_sample)*value_at_sample(sound,left_sample)+delta_sample*value_at_sample(sound,left_sample+1)
+    return ((1-delta_sample)*value_at_sample(sound,left_sample,is_cycling)
+            +delta_sample*value_at_sample(sound,left_sample+1,is_cycling))
   elif method=='lanczos':
     value = 0.0
     for i in range(left_sample-a+1,left_sample+a+1):
-      value += value_at_sample(sound,i)*lanczos_kernel(sample-i,a)
+      value += value_at_sample(sound,i,is_cycling)*lanczos_kernel(sample-i,a)
     return value
   else:
     assert False
+
+# BATCH RESAMPLING
+##################
+
+def interpolation_weights(delta_sample,method='lanczos',a=3):
+  """
+  Parameters :
+    delta_sample : fractional part of a sample index (0<=delta_sample<1)
+    method, a : see interpolate_at_sample
+  Returns :
+    a tuple (i_offset,weights) : the interpolated value at left_sample+delta_sample
+    is the sum of weights[i]*sound[left_sample+i_offset+i]
+  """
+  if method=='nearest':
+    return 0,((1.0,0.0) if delta_sample<0.5 else (0.0,1.0))
+  elif method=='linear':
+    return 0,(1-delta_sample,delta_sample)
+  elif method=='lanczos':
+    return 1-a,tuple(lanczos_kernel(delta_sample+a-1-i,a) for i in range(2*a))
+  else:
+    assert False
+
+@lru_cache(maxsize=16)
+def interpolation_table(method='lanczos',a=3,oversampling=512):
+  """
+  Polyphase table : interpolation weights for oversampling+1 regularly
+  spaced fractional parts, from 0.0 to 1.0 (included)
+  Returns :
+    a tuple (i_offset,table) where table is a list of tuples of weights
+  """
+  table = [interpolation_weights(i/oversampling,method,a)[1] for i in range(oversampling)]
+  # weights for 1.0 : weights for 0.0 shifted by one sample
+  table.append((0.0,)+table[0][:-1])
+  return interpolation_weights(0.0,method,a)[0],table
+
+def padded_sound(sound,n_pad,is_cycling=False):
+  """
+  Returns :
+    a compact sound, sound with n_pad samples added before and after
+    (zeros, or the other end of sound if is_cycling)
+  """
+  n_samples = len(sound)
+  if is_cycling:
+    return as_sound(sound[i%n_samples] for i in range(-n_pad,n_samples+n_pad))
+  padded = create_sound(n_pad)
+  padded.extend(sound)
+  padded.extend(create_sound(n_pad))
+  return padded
+
+def interpolate_at_samples(sound,samples,is_cycling=False,method='lanczos',a=3,oversampling=512):
+  """
+  Batch version of interpolate_at_sample :
+  the interpolation weights are read from a precomputed table
+  (see interpolation_table) and linearly interpolated between the
+  oversampling+1 tabulated fractional parts.
+  For 'lanczos', differences with interpolate_at_sample stay below
+  1e-5 (relatively to the maximum amplitude of sound) ;
+  'nearest' and 'linear' give the same values.
+  Parameters :
+    sound : list of float
+    samples : list of float sample indices
+    is_cycling, method, a : see interpolate_at_sample
+    oversampling : number of tabulated fractional parts
+  Returns :
+    a compact sound (interpolated signal values)
+  """
+  n_samples = len(sound)
+  output = create_sound(len(samples))
+  if n_samples==0:
+    return output
+  floor = math.floor
+  mul = operator.mul
+  if method=='nearest':
+    # no table needed
+    for j,sample in enumerate(samples):
+      i = floor(sample)
+      if sample-i>=0.5:
+        i += 1
+      if is_cycling:
+        i %= n_samples
+      if 0<=i<n_samples:
+        output[j] = sound[i]
+    return output
+  i_offset,table = interpolation_table(method,a,oversampling)
+  n_taps = len(table[0])
+  padded = padded_sound(sound,n_taps,is_cycling)
+  n_padded = len(padded)
+  for j,sample in enumerate(samples):
+    left_sample = floor(sample)
+    position = (sample-left_sample)*oversampling
+    i_table = int(position)
+    delta = position-i_table
+    if is_cycling:
+      left_sample %= n_samples
+    i_start = left_sample+i_offset+n_taps
+    if i_start<0 or i_start+n_taps>n_padded:
+      continue # out of the sound
+    window = padded[i_start:i_start+n_taps]
+    value = sum(map(mul,window,table[i_table]))
+    if delta!=0.0:
+      value += delta*(sum(map(mul,window,table[i_table+1]))-value)
+    output[j] = value
+  return output
+
+def resample(sound,ratio,method='lanczos',a=3,tolerance=0):
+  """
+  Reads sound at constant speed : output[i] is sound at sample i*ratio
+  When ratio is a fraction p/q (q<=1024), the q different fractional
+  parts are known in advance (polyphase) : their weights are computed
+  exactly and each phase is processed at once, by strides of p samples.
+  Otherwise :
+    tolerance=0 : interpolate_at_samples is used (exact positions)
+    tolerance>0 : ratio is approximated by a fraction p/q (polyphase)
+      whose phases are re-anchored on their exact position every
+      tolerance/|q*ratio-p| outputs, so that output[i] is read within
+      tolerance/2 samples of i*ratio whatever the length of sound
+      (the value error is then about pi*tolerance/2 at most, relatively
+      to the maximum amplitude, 2*pi*f/sampling_rate*tolerance/2 for a
+      sine of frequency f), 2 to 3 times faster for tolerance=1e-3
+  Parameters :
+    sound : list of float
+    ratio : a float (2.0 : twice as fast)
+    method, a : see interpolate_at_sample
+    tolerance : maximum position error (in samples of sound)
+  Returns :
+    a compact sound of length int(len(sound)/ratio)
+  """
+  n_output = int(len(sound)/ratio)
+  fraction = Fraction(ratio).limit_denominator(1024)
+  if float(fraction)==ratio:
+    p,q = fraction.numerator,fraction.denominator
+    drift = 0
+  else:
+    if tolerance<=0:
+      return interpolate_at_samples(sound,[i*ratio for i in range(n_output)],False,method,a)
+    # fraction minimising the number of re-anchored segments
+    n_segments = math.inf
+    max_denominator = 1
+    while max_denominator<=max(1024,n_output):
+      fraction = Fraction(ratio).limit_denominator(max_denominator)
+      # drift of a phase (in samples) from one output to the next
+      fraction_drift = float(Fraction(ratio)*fraction.denominator-fraction.numerator)
+      fraction_n_segments = fraction.denominator+n_output*abs(fraction_drift)/tolerance
+      if fraction_n_segments<n_segments:
+        n_segments = fraction_n_segments
+        p,q,drift = fraction.numerator,fraction.denominator,fraction_drift
+      max_denominator *= 2
+    # short segments : slower than interpolate_at_samples
+    if n_segments>n_output/8:
+      return interpolate_at_samples(sound,[i*ratio for i in range(n_output)],False,method,a)
+  i_offset,weights = interpolation_weights(0.0,method,a)
+  n_taps = len(weights) # always even
+  padded = padded_sound(sound,n_taps)
+  output = create_sound(n_output)
+  for i_phase in range(min(q,n_output)):
+    # outputs i_phase+k*q : same fractional part r/q, left sample += k*p
+    n_phase_output = len(range(i_phase,n_output,q))
+    segment_size = max(1,int(tolerance/abs(drift))) if drift else n_phase_output
+    for k_start in range(0,n_phase_output,segment_size):
+      k_end = min(k_start+segment_size,n_phase_output)
+      if drift:
+        # exact position in the middle of the segment
+        k_middle = (k_start+k_end-1)//2
+        position = (i_phase+k_middle*q)*ratio-(k_middle-k_start)*p
+        left_sample = math.floor(position)
+        weights = interpolation_weights(position-left_sample,method,a)[1]
+      else:
+        left_sample,r = divmod(i_phase*p,q)
+        weights = interpolation_weights(r/q,method,a)[1]
+      i_start = left_sample+i_offset+n_taps
+      i_end = i_start+(k_end-k_start-1)*p+1
+      # 2 taps at a time
+      w0,w1 = weights[0],weights[1]
+      segment_output = [w0*x0+w1*x1 for x0,x1 in zip(padded[i_start:i_end:p],padded[i_start+1:i_end+1:p])]
+      for i in range(2,n_taps,2):
+        w0,w1 = weights[i],weights[i+1]
+        segment_output = [y+w0*x0+w1*x1 for y,x0,x1 in zip(segment_output,padded[i_start+i:i_end+i:p],padded[i_start+i+1:i_end+i+1:p])]
+      output[i_phase+k_start*q:i_phase+(k_end-1)*q+1:q] = as_sound(segment_output)
+  return output
+
+class Resampler:
+  """
+  Block by block version of resample (e.g. for WAV files read or written
+  at another sampling rate) : output[i] is the stream at sample i*ratio,
+  the last samples being given by flush
+  (interpolate_at_samples is used, see its tolerance)
+  """
+  def __init__(self,ratio,method='lanczos',a=3):
+    """
+    Parameters :
+      ratio : a float (2.0 : twice as fast)
+      method, a : see interpolate_at_sample
+    """
+    self.ratio = ratio
+    self.method = method
+    self.a = a
+    # interpolation window : at most n_taps samples around a position
+    self.n_taps = len(interpolation_weights(0.0,method,a)[1])+1
+    self.reset()
+
+  def reset(self):
+    # pending input samples, from sample i_buffer of the stream
+    self.buffer = create_sound()
+    self.i_buffer = 0
+    self.n_input = 0
+    self.i_output = 0
+
+  def resample_until(self,i_end):
+    """
+    Returns :
+      a compact sound, outputs from i_output to i_end (excluded)
+    """
+    ratio = self.ratio
+    samples = [i*ratio-self.i_buffer for i in range(self.i_output,i_end)]
+    output = interpolate_at_samples(self.buffer,samples,False,self.method,self.a)
+    self.i_output = max(self.i_output,i_end)
+    # input samples out of reach of the next outputs
+    n_drop = max(0,math.floor(self.i_output*ratio)-self.n_taps-self.i_buffer)
+    del self.buffer[:n_drop]
+    self.i_buffer += n_drop
+    return output
+
+  def process(self,block):
+    """
+    Parameters :
+      block : a list of float
+    Returns :
+      a compact sound, the outputs whose window has been received
+    """
+    self.buffer.extend(as_sound(block))
+    self.n_input += len(block)
+    i_end = math.floor((self.n_input-self.n_taps)/self.ratio)+1
+    return self.resample_until(min(i_end,int(self.n_input/self.ratio)))
+
+  def flush(self):
+    """
+    Returns :
+      the last outputs (int(n_input/ratio) outputs in all,
+      the stream being followed by zeros)
+    """
+    return self.resample_until(int(self.n_input/self.ratio))
+
+# AUTOMATION
+############
+# Control signals (envelopes, frequencies, delays...) described by points
+# joined by linear or exponential segments, and only evaluated block by
+# block : within a segment, each value is obtained from the previous one
+# by adding (linear) or multiplying (exponential) a constant step.
+
+class AutomationCurve:
+  """
+  Piecewise linear/exponential curve
+  (the first value before the first point, the last one after the last point)
+  """
+  # zero values of exponential segments are approached down to -100dB
+  exponential_floor = 1e-5
+
+  def __init__(self,points,shapes='linear'):
+    """
+    Parameters
+    ----------
+    points : list of tuples (time,value), time in ms, in increasing order
+    shapes : 'linear' or 'exponential', or list of shapes (one per segment)
+    """
+    assert len(points)>0
+    self.times = [float(time) for time,_ in points]
+    self.values = [float(value) for _,value in points]
+    if isinstance(shapes,str):
+      shapes = [shapes]*(len(points)-1)
+    assert len(shapes)==len(points)-1
+    for shape,v0,v1 in zip(shapes,self.values,self.values[1:]):
+      assert shape in ('linear','exponential')
+      if shape=='exponential' and v0*v1<0:
+        raise ValueError("exponential segments cannot change sign")
+    self.shapes = list(shapes)
+    # position of next_block
+    self.i_sample = 0
+
+  def duration(self):
+    """
+    Returns
+    -------
+    time of the last point (in ms)
+    """
+    return self.times[-1]
+
+  def n_samples(self,duration=None):
+    """
+    Returns
+    -------
+    number of samples of duration (duration of the curve if None)
+    """
+    if duration is None:
+      duration = self.duration()
+    return int(duration*get_sampling_rate()/1000)
+
+  def block(self,i_start,n_samples):
+    """
+    Parameters
+    ----------
+    i_start : index of the first sample
+    n_samples : number of samples
+    Returns
+    -------
+    a compact sound, values of the curve from sample i_start
+    """
+    scale = get_sampling_rate()/1000
+    samples = [time*scale for time in self.times]
+    values = self.values
+    block = create_sound()
+    i = i_start
+    i_end = i_start+n_samples
+    while i<i_end:
+      k = bisect.bisect_right(samples,i)
+      if k==0:
+        n = min(i_end,math.ceil(samples[0]))-i
+        block.extend(create_sound(n,values[0]))
+      elif k==len(samples):
+        n = i_end-i
+        block.extend(create_sound(n,values[-1]))
+      else:
+        n = min(i_end,math.ceil(samples[k]))-i
+        s0,s1 = samples[k-1],samples[k]
+        v0,v1 = values[k-1],values[k]
+        if v0==v1:
+          block.extend(create_sound(n,v0))
+        elif self.shapes[k-1]=='linear':
+          step = (v1-v0)/(s1-s0)
+          steps = itertools.repeat(step,n-1)
+          block.extend(itertools.accumulate(itertools.chain((v0+step*(i-s0),),steps)))
+        else:
+          floor = self.exponential_floor
+          sign = -1 if v0+v1<0 else 1
+          v0 = v0 if v0!=0 else sign*floor
+          v1 = v1 if v1!=0 else sign*floor
+          ratio = (v1/v0)**(1/(s1-s0))
+          steps = itertools.repeat(ratio,n-1)
+          block.extend(itertools.accumulate(itertools.chain((v0*ratio**(i-s0),),steps),operator.mul))
+      i += n
+    return block
+
+  def next_block(self,n_samples):
+    """
+    Returns
+    -------
+    the next n_samples values (the position is kept between calls,
+    see reset)
+    """
+    block = self.block(self.i_sample,n_samples)
+    self.i_sample += n_samples
+    return block
+
+  def reset(self):
+    self.i_sample = 0
+
+  def blocks(self,n_samples,block_size=4096):
+    """
+    Returns
+    -------
+    a generator of the blocks of the n_samples first values
+    """
+    for i_start in range(0,n_samples,block_size):
+      yield self.block(i_start,min(block_size,n_samples-i_start))
+
+  def render(self,duration=None):
+    """
+    Returns
+    -------
+    a compact sound, the values of the curve during duration (in ms,
+    duration of the curve if None)
+    """
+    return self.block(0,self.n_samples(duration))
+
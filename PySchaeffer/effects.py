@@ -1,17 +1,22 @@
-import math
+import cmath,math,operator,os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from fractions import Fraction
 from PySchaeffer.base import *
 from PySchaeffer.analysis import *
+from PySchaeffer.backend import accelerated,get_backend,set_backend
 
 # SOUND EFFECTS
 ###############
 
 def create_output(sound,is_in_place):
   """
-  Utility fonction that provides either a copy or deep copy
-  depending on the boolean is_in_place
+  Utility fonction that provides the output buffer depending on the
+  boolean is_in_place : sound itself if True, a new zero-filled compact
+  sound of the same length otherwise (to be filled from sound)
   """
   if not is_in_place:
-    sound_out = [0 for _ in len(sound)]
+    sound_out = create_sound(len(sound))
   else:
     sound_out = sound
   return sound_out
@@ -27,7 +32,7 @@ def amplify(sound,factor,is_in_place=True):
   is_in_place : returned list (sound_out) and sound are the same
   Returns
   -------
-  a list of float
+  a list of float (a compact sound if not is_in_place)
   """
   sound_out = create_output(sound,is_in_place)
   for i in range(len(sound)):
@@ -53,29 +58,50 @@ def apply_envelope(sound,control_points,is_in_place=True):
     relative_time : between 0.0 (sound start) and 1.0 (sound end)
     amplitude : amplification factor
   relative_time data should be in increasing order
+  control_points can also be an AutomationCurve (times in ms from the
+  sound start), evaluated block by block
   """
-  sampling_rate = 44100
   sound_out = create_output(sound,is_in_place)
-  # complete control points
-  if control_points[0][0]>0:
-    control_points[0].insert(0,(0.0,0.0))
-  if control_points[-1][0]<1:
-    control_points[0].append((1.0,0.0))
-  #
-  i_right_point = 1
-  for i in range(len(sound)):
-    # /!\ relative time from 0.0 to 1.0 /!\
-    time = i/len(sound)
-    while control_points[i_right_point][0]<=time:
-      i_right_point += 1
-    left_time,left_amp = control_points[i_right_point-1]
-    right_time,right_amp = control_points[i_right_point]
-    amp = (left_amp*(right_time-time)+right_amp*(time-left_time))\
-          /(right_time-left_time)
-    sound[i] *= amp
+  if isinstance(control_points,AutomationCurve):
+    envelope = control_points
+  else:
+    # complete control points
+    points = list(control_points)
+    if points[0][0]>0:
+      points.insert(0,(0.0,0.0))
+    if points[-1][0]<1:
+      points.append((1.0,0.0))
+    sound_duration = len(sound)*1000/get_sampling_rate()
+    envelope = AutomationCurve([(time*sound_duration,amp) for time,amp in points])
+  n_samples = len(sound_out)
+  block_size = 4096
+  for i_start in range(0,n_samples,block_size):
+    i_end = min(i_start+block_size,n_samples)
+    amps = envelope.block(i_start,i_end-i_start)
+    sound_out[i_start:i_end] = as_sound(map(operator.mul,sound[i_start:i_end],amps))
   return sound_out
 
-def apply_adsr(sound,adsr,is_in_place=True):
+def design_adsr(adsr,duration,shape='linear'):
+  """
+  Parameters
+  ----------
+  adsr : a tuple (a,d,s,r) (see apply_adsr)
+  duration : duration of the sound (in ms)
+  shape : 'linear' or 'exponential' segments
+  Returns
+  -------
+  an AutomationCurve
+  """
+  attack,decay,sustain,release = adsr
+  return AutomationCurve([
+    (0.0,0.0),
+    (attack,1.0),
+    (attack+decay,sustain),
+    (duration-release,sustain),
+    (duration,0.0)
+  ],shape)
+
+def apply_adsr(sound,adsr,is_in_place=True,shape='linear'):
   """
   https://en.wikipedia.org/wiki/Envelope_(music)
   Sustain time is infered from sound length
@@ -84,27 +110,22 @@ def apply_adsr(sound,adsr,is_in_place=True):
   Parameters
   ----------
   sound : list of float
-  asdr : a tuple (a,d,s,r)
+  asdr : a tuple (a,d,s,r) or an AutomationCurve
     a : attack (in ms)
     d : decay (in ms)
     s : sustain (float factor)
     r : release (in ms)
   is_in_place : returned list (sound_out) and sound are the same
+  shape : 'linear' or 'exponential' segments
   Returns
   -------
   a list of float
   """
-  sampling_rate = 44100
+  if isinstance(adsr,AutomationCurve):
+    return apply_envelope(sound,adsr,is_in_place)
+  sampling_rate = get_sampling_rate()
   sound_duration = len(sound)*1000/sampling_rate
-  attack,decay,sustain,release = adsr
-  envelope = [
-    (0.0,0.0),
-    (attack/sound_duration,1.0),
-    ((attack+decay)/sound_duration,sustain),
-    (1.0-release/sound_duration,sustain),
-    (1.0,0.0)
-  ]
-  return apply_envelope(sound,envelope,is_in_place)
+  return apply_envelope(sound,design_adsr(adsr,sound_duration,shape),is_in_place)
 
 # FILTERS
 # Designs :
@@ -112,7 +133,7 @@ def apply_adsr(sound,adsr,is_in_place=True):
 
 def design_low_pass(f0,Q):
   # pulsation :
-  sampling_rate = 44100
+  sampling_rate = get_sampling_rate()
   omega0 = 2*math.pi*f0/sampling_rate
   alpha = math.sin(omega0)/2/Q
   b = [(1-math.cos(omega0))/2,1-math.cos(omega0),(1-math.cos(omega0))/2]
@@ -121,7 +142,7 @@ def design_low_pass(f0,Q):
 
 def design_high_pass(f0,Q):
   # pulsation :
-  sampling_rate = 44100
+  sampling_rate = get_sampling_rate()
   omega0 = 2*math.pi*f0/sampling_rate
   alpha = math.sin(omega0)/2/Q
   b = [(1+math.cos(omega0))/2,-(1+math.cos(omega0)),(1+math.cos(omega0))/2]
@@ -130,7 +151,7 @@ def design_high_pass(f0,Q):
 
 def design_band_pass(f0,Q):
   # pulsation :
-  sampling_rate = 44100
+  sampling_rate = get_sampling_rate()
   omega0 = 2*math.pi*f0/sampling_rate
   alpha = math.sin(omega0)/2/Q
   b = [alpha,0,-alpha]
@@ -139,7 +160,7 @@ def design_band_pass(f0,Q):
 
 def design_low_shelf(f0,dB_gain):
   # pulsation :
-  sampling_rate = 44100
+  sampling_rate = get_sampling_rate()
   omega0 = 2*math.pi*f0/sampling_rate
   cos_omega0 = math.cos(omega0)
   S = 1
@@ -159,7 +180,7 @@ def design_low_shelf(f0,dB_gain):
 
 def design_high_shelf(f0,dB_gain):
   # pulsation :
-  sampling_rate = 44100
+  sampling_rate = get_sampling_rate()
   omega0 = 2*math.pi*f0/sampling_rate
   cos_omega0 = math.cos(omega0)
   S = 1
@@ -177,25 +198,428 @@ def design_high_shelf(f0,dB_gain):
   ]
   return b,a
 
+@accelerated
 def apply_iir_filter(sound_in,numerator,denominator=[1]):
   """
   https://en.wikipedia.org/wiki/Infinite_impulse_response
   numerator = [b0,b1,...,bP]
   denominator = [a0,a1,...,aQ]
+  (direct form, see IIRFilter for high orders or block processing)
   """
-  n_samples = len(sound_in)
-  sound_out = [0]*n_samples
-  for n in range(n_samples):
-    for i in range(len(numerator)):
-      i_in = n-i
-      if i_in>=0:
-        sound_out[n] += numerator[i]*sound_in[i_in]
-    for i in range(1,len(denominator)):
-      i_out = n-i
-      if i_out>=0:
-        sound_out[n] -= denominator[i]*sound_out[i_out]
-    sound_out[n] /= denominator[0]
-  return sound_out
+  a0 = denominator[0]
+  b = [value/a0 for value in numerator]
+  a = [value/a0 for value in denominator[1:]]
+  # last inputs and outputs, the most recent first
+  inputs = deque([0.0]*len(b),maxlen=len(b))
+  outputs = deque([0.0]*len(a),maxlen=len(a))
+  sound_out = []
+  for sample in sound_in:
+    inputs.appendleft(sample)
+    value = sum(map(operator.mul,b,inputs))-sum(map(operator.mul,a,outputs))
+    outputs.appendleft(value)
+    sound_out.append(value)
+  return as_sound(sound_out)
+
+# SECOND-ORDER SECTIONS
+# High order filters are factored into biquads (poles and zeros paired
+# by complex conjugates) which are much less sensitive to rounding :
+# https://en.wikipedia.org/wiki/Digital_biquad_filter
+# Roots are found with the Aberth method :
+# https://en.wikipedia.org/wiki/Aberth_method
+
+def find_polynomial_roots(coefficients,n_iterations=500):
+  """
+  Parameters :
+    coefficients : [c0,c1,...,cN] for c0*z**N+c1*z**(N-1)+...+cN
+  Returns :
+    list of N complex roots
+  """
+  coefficients = list(coefficients)
+  while len(coefficients)>0 and coefficients[0]==0:
+    del coefficients[0]
+  n = len(coefficients)-1
+  if n<1:
+    return []
+  c = [value/coefficients[0] for value in coefficients]
+  derivative = [(n-k)*c[k] for k in range(n)]
+  # initial guesses on a circle, radius being the geometric mean of the roots
+  radius = abs(c[n])**(1/n) or 1.0
+  roots = [cmath.rect(radius,2*math.pi*k/n+0.4) for k in range(n)]
+  for _ in range(n_iterations):
+    max_offset = 0
+    for k in range(n):
+      z = roots[k]
+      p = 0j
+      for value in c:
+        p = p*z+value
+      if p==0:
+        continue
+      dp = 0j
+      for value in derivative:
+        dp = dp*z+value
+      ratio = p/dp
+      repulsion = sum(1/(z-root) for j,root in enumerate(roots) if j!=k and root!=z)
+      offset = ratio/(1-ratio*repulsion)
+      roots[k] = z-offset
+      max_offset = max(max_offset,abs(offset)/max(abs(z),1e-300))
+    if max_offset<1e-15:
+      break
+  return roots
+
+def polish_root(coefficients,root,multiplicity=1,n_iterations=3):
+  """
+  Newton's iterations in rational arithmetic (about 120 bits), since roots
+  of high order polynomials found in floating point are not accurate enough
+  (a root of multiplicity m being a simple root of the (m-1)th derivative)
+  --
+  Parameters :
+    coefficients : [c0,c1,...,cN] for c0*z**N+c1*z**(N-1)+...+cN
+    root : an approximate root (complex)
+    multiplicity : multiplicity of the root
+  Returns :
+    real and imaginary parts of the root (Fraction)
+  """
+  c = [Fraction(value) for value in coefficients]
+  for _ in range(multiplicity-1):
+    c = [value*(len(c)-1-k) for k,value in enumerate(c[:-1])]
+  re,im = Fraction(root.real),Fraction(root.imag)
+  scale = 2**120
+  for _ in range(n_iterations):
+    p_re = p_im = dp_re = dp_im = 0
+    for value in c:
+      dp_re,dp_im = dp_re*re-dp_im*im+p_re,dp_re*im+dp_im*re+p_im
+      p_re,p_im = p_re*re-p_im*im+value,p_re*im+p_im*re
+    norm = dp_re*dp_re+dp_im*dp_im
+    if norm==0:
+      break
+    re -= (p_re*dp_re+p_im*dp_im)/norm
+    im -= (p_im*dp_re-p_re*dp_im)/norm
+    re = Fraction(round(re*scale),scale)
+    im = Fraction(round(im*scale),scale)
+  return re,im
+
+def cluster_roots(roots,tolerance):
+  """
+  Parameters :
+    roots : list of complex
+    tolerance : relative distance under which roots are considered equal
+  Returns :
+    list of complex, near-repeated roots (which the root finder spreads
+    around the actual multiple root) being replaced by their mean
+  """
+  clusters = []
+  for root in roots:
+    for cluster in clusters:
+      centre = sum(cluster)/len(cluster)
+      if abs(root-centre)<=tolerance*max(1,abs(centre)):
+        cluster.append(root)
+        break
+    else:
+      clusters.append([root])
+  clustered_roots = []
+  for cluster in clusters:
+    centre = sum(cluster)/len(cluster)
+    # a cluster across the real axis is a real multiple root
+    if min(root.imag for root in cluster)<=0<=max(root.imag for root in cluster):
+      centre = complex(centre.real)
+    clustered_roots.extend([centre]*len(cluster))
+  return clustered_roots
+
+def pair_roots(roots,coefficients):
+  """
+  Parameters :
+    roots : approximate roots of the polynomial (see find_polynomial_roots)
+    coefficients : [c0,c1,...,cN] for c0*z**N+c1*z**(N-1)+...+cN
+  Returns :
+    list of ([1,c1,c2],root) : real polynomials (1-r1.z^-1)(1-r2.z^-1)
+    grouping conjugate roots or two real roots, and one of their roots
+  """
+  def is_real(root):
+    return abs(root.imag)<=1e-9*max(1,abs(root))
+  def polished(root,original_root):
+    # clustered roots (see cluster_roots) are repeated
+    return polish_root(coefficients,root,max(1,roots.count(original_root)))
+  real_roots = [root for root in roots if is_real(root)]
+  complex_roots = sorted((root for root in roots if not is_real(root)),key=lambda root:-abs(root.imag))
+  factors = []
+  # each complex root with its nearest conjugate partner
+  while len(complex_roots)>0:
+    root = complex_roots.pop(0)
+    if len(complex_roots)==0:
+      real_roots.append(complex(root.real))
+      break
+    i_partner = min(range(len(complex_roots)),key=lambda i:abs(complex_roots[i]-root.conjugate()))
+    partner = complex_roots.pop(i_partner)
+    original_root = root
+    root = complex((root.real+partner.real)/2,(abs(root.imag)+abs(partner.imag))/2)
+    re,im = polished(root,original_root)
+    factors.append(([1.0,float(-2*re),float(re*re+im*im)],root))
+  real_roots = sorted(polished(complex(root.real),root)[0] for root in real_roots)
+  for i in range(0,len(real_roots)-1,2):
+    r1,r2 = real_roots[i],real_roots[i+1]
+    factors.append(([1.0,float(-(r1+r2)),float(r1*r2)],complex(r1)))
+  if len(real_roots)%2==1:
+    factors.append(([1.0,float(-real_roots[-1]),0.0],complex(real_roots[-1])))
+  return factors
+
+def multiply_polynomials(p,q):
+  product = [0.0]*(len(p)+len(q)-1)
+  for i,p_value in enumerate(p):
+    for j,q_value in enumerate(q):
+      product[i+j] += p_value*q_value
+  return product
+
+def factor_into_sections(b,a,n_delay,tolerance):
+  """
+  Parameters :
+    b,a : coefficients (b[0] and a[0] not 0, no trailing zeros)
+    n_delay : number of leading zeros of the numerator
+    tolerance : see cluster_roots
+  Returns :
+    list of biquad sections (see design_sections)
+  """
+  gain = b[0]/a[0]
+  poles = pair_roots(cluster_roots(find_polynomial_roots(a),tolerance),a)
+  zeros = pair_roots(cluster_roots(find_polynomial_roots(b),tolerance),b)
+  n_sections = max(len(poles),len(zeros),1)
+  poles += [([1.0,0.0,0.0],0j)]*(n_sections-len(poles))
+  poles.sort(key=lambda factor:abs(factor[1]))
+  sections = []
+  for a_section,pole in poles:
+    b_section = [1.0,0.0,0.0]
+    if len(zeros)>0:
+      i_zero = min(range(len(zeros)),key=lambda i:abs(zeros[i][1]-pole))
+      b_section = zeros.pop(i_zero)[0]
+    sections.append((list(b_section),list(a_section)))
+  # delays : shift the numerators when possible, extra sections otherwise
+  for b_section,a_section in sections:
+    while n_delay>0 and b_section[2]==0:
+      b_section[1:] = b_section[:2]
+      b_section[0] = 0.0
+      n_delay -= 1
+  while n_delay>0:
+    delay = min(n_delay,2)
+    sections.append(([0.0,1.0,0.0] if delay==1 else [0.0,0.0,1.0],[1.0,0.0,0.0]))
+    n_delay -= delay
+  sections[0] = ([value*gain for value in sections[0][0]],sections[0][1])
+  return sections
+
+def sections_error(sections,b,a):
+  """
+  Returns :
+    relative difference between the coefficients of the cascade of sections
+    and b,a (normalised by a[0]), inf if their degrees differ
+  """
+  error = 0.0
+  for i_part,coefficients in ((0,b),(1,a)):
+    product = [1.0]
+    for section in sections:
+      product = multiply_polynomials(product,section[i_part])
+    while len(product)>1 and product[-1]==0:
+      del product[-1]
+    expected = [value/a[0] for value in coefficients]
+    if len(product)!=len(expected):
+      return math.inf
+    scale = max(map(abs,expected))
+    error = max(error,max(abs(x-y) for x,y in zip(product,expected))/scale)
+  return error
+
+def design_sections(numerator,denominator=[1]):
+  """
+  Parameters :
+    numerator = [b0,b1,...,bP]
+    denominator = [a0,a1,...,aQ]
+    (leading zeros of the numerator are pure delays)
+  Returns :
+    list of sections ([b0,b1,b2],[1,a1,a2]) to be applied in cascade,
+    the most resonant ones last
+    (a single direct form section (b,a) if the factorisation fails)
+  """
+  b = [float(value) for value in numerator]
+  a = [float(value) for value in denominator]
+  while len(a)>1 and a[-1]==0:
+    del a[-1]
+  while len(b)>1 and b[-1]==0:
+    del b[-1]
+  n_delay = 0
+  while n_delay<len(b) and b[n_delay]==0:
+    n_delay += 1
+  if n_delay==len(b):
+    return [([0.0,0.0,0.0],[1.0,0.0,0.0])]
+  if len(a)<=3 and len(b)<=3:
+    return [(([value/a[0] for value in b]+[0.0,0.0])[:3],([value/a[0] for value in a]+[0.0,0.0])[:3])]
+  # multiple roots (e.g. cascaded designs) are found spread around their
+  # actual value : the clustering giving the closest cascade is kept
+  best_sections,best_error = None,math.inf
+  for tolerance in (0,1e-6,1e-4,1e-3,1e-2,3e-2):
+    sections = factor_into_sections(b[n_delay:],a,n_delay,tolerance)
+    error = sections_error(sections,b,a)
+    if error<best_error:
+      best_sections,best_error = sections,error
+    if error<1e-12:
+      break
+  if best_error>1e-9:
+    return [([value/a[0] for value in b],[value/a[0] for value in a])]
+  return best_sections
+
+class IIRFilter:
+  """
+  Cascade of biquads in transposed direct form II,
+  keeping its state between successive blocks
+  (see design_sections, higher order sections are also accepted)
+  """
+  def __init__(self,filters):
+    """
+    Parameters :
+      filters : (b,a) tuple (see design_low_pass...) or list of (b,a) sections
+    """
+    self.sections = []
+    for b,a in filter_sections(filters):
+      self.sections.extend(design_sections(b,a))
+    self.reset()
+
+  def reset(self):
+    self.states = [[0.0]*(max(len(b),len(a))-1) for b,a in self.sections]
+
+  def process(self,block):
+    """
+    Parameters :
+      block : a list of float
+    Returns :
+      a compact sound, the filtered block
+    """
+    signal = block
+    for i_section,(b,a) in enumerate(self.sections):
+      if len(b)==3 and len(a)==3:
+        b0,b1,b2 = b
+        _,a1,a2 = a
+        s1,s2 = self.states[i_section]
+        output = []
+        for x in signal:
+          y = b0*x+s1
+          s1 = b1*x-a1*y+s2
+          s2 = b2*x-a2*y
+          output.append(y)
+        self.states[i_section] = [s1,s2]
+      else:
+        output = process_direct_form(signal,b,a,self.states[i_section])
+      signal = output
+    return as_sound(signal)
+
+def process_direct_form(signal,b,a,state):
+  """
+  Transposed direct form II of any order
+  --
+  Parameters :
+    signal : a list of float
+    b,a : coefficients (a[0] being 1)
+    state : list of max(len(b),len(a))-1 floats, updated
+  Returns :
+    a list of float
+  """
+  n = len(state)+1
+  b = list(b)+[0.0]*(n-len(b))
+  a = list(a)+[0.0]*(n-len(a))
+  b0 = b[0]
+  taps = list(zip(range(n-1),b[1:],a[1:]))
+  output = []
+  for x in signal:
+    y = b0*x+(state[0] if n>1 else 0.0)
+    for k,b_k,a_k in taps:
+      state[k] = b_k*x-a_k*y+(state[k+1] if k+1<n-1 else 0.0)
+    output.append(y)
+  return output
+
+# FILTER BANKS
+# The same input through many filters (equalisers, vocoders, formants...)
+# or the same filter over many sounds : sections are designed only once.
+# Bands are processed one after the other, each in a tight loop with its own
+# coefficients, which is faster in Python than interleaving the bands sample
+# by sample.
+
+class FilterBank:
+  """
+  Filters applied in parallel to the same input,
+  keeping their states between successive blocks
+  """
+  def __init__(self,filters,gains=None,is_mixed=False):
+    """
+    Parameters :
+      filters : list of (b,a) tuples (see design_band_pass...)
+        or of lists of (b,a) sections
+      gains : list of float, one per filter, used by mix (1.0 if None)
+      is_mixed : process returns the mix (True, e.g. in a Pipeline)
+        or each filtered block (False)
+    """
+    self.filters = [IIRFilter(band) for band in filters]
+    if gains is None:
+      gains = [1.0]*len(self.filters)
+    assert len(gains)==len(self.filters)
+    self.gains = list(gains)
+    self.is_mixed = is_mixed
+
+  def reset(self):
+    for band in self.filters:
+      band.reset()
+
+  def process(self,block):
+    """
+    Parameters :
+      block : a list of float
+    Returns :
+      list of compact sounds, the block filtered by each filter
+      (their mix if is_mixed)
+    """
+    if self.is_mixed:
+      return self.mix(block)
+    return [band.process(block) for band in self.filters]
+
+  def mix(self,block):
+    """
+    Parameters :
+      block : a list of float
+    Returns :
+      a compact sound, sum of the filtered blocks weighted by gains
+    """
+    mix = create_sound(len(block))
+    for band,gain in zip(self.filters,self.gains):
+      if gain==0:
+        band.process(block)
+      elif gain==1:
+        mix[:] = as_sound(map(operator.add,mix,band.process(block)))
+      else:
+        mix[:] = as_sound(map(operator.add,mix,map(gain.__mul__,band.process(block))))
+    return mix
+
+def apply_filter_bank(sound,filters,gains=None,is_mixed=True):
+  """
+  Parameters :
+    sound : list of float
+    filters : list of filters (see FilterBank)
+    gains : list of float, one per filter (1.0 if None)
+    is_mixed : return the weighted sum (True) or each filtered sound (False)
+  Returns :
+    a compact sound or a list of compact sounds
+  """
+  bank = FilterBank(filters,gains)
+  if is_mixed:
+    return bank.mix(sound)
+  return bank.process(sound)
+
+def apply_filter_to_sounds(sounds,filters):
+  """
+  Parameters :
+    sounds : list of sounds (list of float)
+    filters : (b,a) tuple or list of (b,a) sections
+  Returns :
+    list of compact sounds, each sound filtered independently
+  """
+  iir_filter = IIRFilter(filters)
+  filtered_sounds = []
+  for sound in sounds:
+    iir_filter.reset()
+    filtered_sounds.append(iir_filter.process(sound))
+  return filtered_sounds
 
 # REVERB
 ########
@@ -217,8 +641,8 @@ def apply_ffbcf(sound,n_delay,feedback_b,feedback_a):
     filtered sound
   """
   n_samples = len(sound)
-  output_sound = [0]*n_samples
-  feedback_sound = [0]*n_samples
+  output_sound = create_sound(n_samples)
+  feedback_sound = create_sound(n_samples)
   for n in range(n_samples):
     output_sound[n] = sound[n]
     # feedback input : delayed output_sound
@@ -250,7 +674,7 @@ def apply_lbcf(sound,N,f,d):
   feedback_b = [f*(1-d)]
   feedback_a = [1,-d]
   output_sound = apply_ffbcf(sound,N,feedback_b,feedback_a)
-  output_sound = ([0]*N)+output_sound[:-N]
+  output_sound = create_sound(N)+output_sound[:-N]
   return output_sound
 
 def apply_freeverb_allpass(sound,N,g):
@@ -276,66 +700,384 @@ def apply_freeverb_allpass(sound,N,g):
     n -= 1
   return output_sound
 
+# FREEVERB ENGINE
+# Same algorithm as the filters above, but with circular buffers of the
+# last N samples of each comb and allpass, so that the sound can be
+# processed block by block (and the tail flushed at the end).
+#   comb : out[n] = x[n]+fb[n], fb[n] = f*(1-d)*out[n-N]+d*fb[n-1],
+#          output out[n-N]
+#   allpass : v[n] = x[n]+g*v[n-N], output -v[n]+v[n-N]
+# Each filter runs over the whole block in its own loop, which is faster
+# in Python than running all the filters sample by sample.
+
+class FreeverbChannel:
+  """
+  Eight lowpass-feedback comb filters in parallel followed by
+  four allpass filters in series
+  """
+  def __init__(self,lbcf_delays,ap_delays,f,d,g):
+    assert 0<=f<1 and 0<=d<1
+    self.f = f
+    self.d = d
+    self.g = g
+    # [buffer,index,feedback state] for each comb
+    self.combs = [[[0.0]*N,0,0.0] for N in lbcf_delays]
+    # [buffer,index] for each allpass
+    self.allpasses = [[[0.0]*N,0] for N in ap_delays]
+
+  def process(self,block):
+    """
+    Parameters :
+      block : a list of float
+    Returns :
+      a compact sound
+    """
+    feedback = self.f*(1-self.d)
+    d = self.d
+    g = self.g
+    output = create_sound(len(block))
+    for comb in self.combs:
+      buffer,i,state = comb
+      N = len(buffer)
+      delayed = []
+      for x in block:
+        value = buffer[i]
+        state = feedback*value+d*state
+        buffer[i] = x+state
+        delayed.append(value)
+        i += 1
+        if i==N:
+          i = 0
+      comb[1] = i
+      comb[2] = state
+      output[:] = as_sound(map(operator.add,output,delayed))
+    for allpass in self.allpasses:
+      buffer,i = allpass
+      N = len(buffer)
+      filtered = []
+      for x in output:
+        value = buffer[i]
+        v = x+g*value
+        buffer[i] = v
+        filtered.append(-v+value)
+        i += 1
+        if i==N:
+          i = 0
+      allpass[1] = i
+      output = as_sound(filtered)
+    return output
+
+class Freeverb:
+  """
+  Freeverb keeping its state between successive blocks
+  (see apply_freeverb)
+  """
+  lbcf_delays = [1557,1617,1491,1422,1277,1356,1188,1116]
+  ap_delays = [225,556,441,341]
+
+  def __init__(self,f=0.84,d=0.2,g=0.5,stereo_spread=None):
+    """
+    Parameters :
+      f : feedback of the combs (0<=float<1)
+      d : damping of the combs (0<=float<1)
+      g : gain of the allpasses
+      stereo_spread : None (mono) or delay in samples added to the filters
+        of the right channel (23 in the original freeverb)
+    """
+    # delays (in samples) tuned for 44100Hz
+    scale = get_sampling_rate()/44100
+    spreads = [0] if stereo_spread is None else [0,stereo_spread]
+    self.is_stereo = stereo_spread is not None
+    self.channels = [
+      FreeverbChannel(
+        [round((N+spread)*scale) for N in self.lbcf_delays],
+        [round((N+spread)*scale) for N in self.ap_delays],
+        f,d,g)
+      for spread in spreads]
+
+  def process(self,block):
+    """
+    Parameters :
+      block : a list of float
+    Returns :
+      a compact sound (a tuple of two compact sounds if stereo)
+    """
+    outputs = tuple(channel.process(block) for channel in self.channels)
+    return outputs if self.is_stereo else outputs[0]
+
+  def flush(self,threshold=1e-6,max_duration=10000):
+    """
+    Parameters :
+      threshold : the tail stops at the first block below threshold
+      max_duration : maximum duration of the tail (in ms)
+    Returns :
+      the reverb tail (same format as process)
+    """
+    block_size = 4096
+    n_max = int(max_duration*get_sampling_rate()/1000)
+    tails = tuple(create_sound() for channel in self.channels)
+    n_samples = 0
+    while n_samples<n_max:
+      blocks = self.process(create_sound(min(block_size,n_max-n_samples)))
+      if not self.is_stereo:
+        blocks = (blocks,)
+      for tail,block in zip(tails,blocks):
+        tail.extend(block)
+      n_samples += len(blocks[0])
+      if max(max(map(abs,block)) for block in blocks)<threshold:
+        break
+    return tails if self.is_stereo else tails[0]
+
 def apply_freeverb(sound,f=0.84,d=0.2,g=0.5):
   """
   Apply freeverb algorithm as described in :
   https://ccrma.stanford.edu/~jos/pasp/Freeverb.html
+  (see Freeverb for block processing, reverb tail and stereo)
   """
-  lbcf_delays = [1557,1617,1491,1422,1277,1356,1188,1116]
-  ap_delays = [225,556,441,341]
-  output_sound = [0]*len(sound)
-  for N in lbcf_delays:
-    output_sound = add_sound(output_sound,apply_lbcf(sound,N,f,d))
-  for N in ap_delays:
-    output_sound = apply_freeverb_allpass(output_sound,N,g)
-  return output_sound
+  return Freeverb(f,d,g).process(sound)
 
 # CONVOLUTION
 #############
 
 def naively_convolve(input_signal,ir_signal):
+  n_output_signal = len(input_signal)+len(ir_signal)
+  return naively_convolve_range(input_signal,ir_signal,0,n_output_signal)
+
+def naively_convolve_range(input_signal,ir_signal,n_start,n_end):
+  """
+  Returns :
+    samples n_start to n_end (excluded) of naively_convolve
+  """
   n_input_signal = len(input_signal)
   n_ir_signal = len(ir_signal)
-  n_output_signal = n_input_signal+n_ir_signal
-  output_signal = [0]*n_output_signal
+  output_signal = create_sound(n_end-n_start)
   #
-  for n in range(n_output_signal):
+  for n in range(n_start,n_end):
     for i in range(n_ir_signal):
       i_in = n-i
       if 0<=i_in<n_input_signal:
-        output_signal[n] += input_signal[i_in]*ir_signal[i]
+        output_signal[n-n_start] += input_signal[i_in]*ir_signal[i]
   return output_signal
 
-def fast_convolve(input_signal,ir_signal):
-  n_input_signal = len(input_signal)
-  n_ir_signal = len(ir_signal)
-  n_output_signal = n_input_signal+n_ir_signal
-  output_signal = [0]*n_output_signal
+def fast_convolve_size(n_ir_signal):
+  """
+  Returns :
+    FFT size used by fast_convolve (power of 2, at least twice the IR)
+  """
   # ir_signal power of 2 size :
   log2_n = 0
   while 2**log2_n<n_ir_signal:
     log2_n += 1
   # including zero-padding necessary for convolution
   log2_n += 1
-  # FFT size
-  n_fft = 2**log2_n
-  ir_signal += [0]*(n_fft-n_ir_signal)
-  ir_fft = analyse_fft(ir_signal)
+  return 2**log2_n
+
+def overlap_add_convolve(input_signal,ir_fft,n_output_signal):
+  """
+  Parameters :
+    input_signal : list of float
+    ir_fft : half spectrum of the zero-padded IR (see fast_convolve)
+    n_output_signal : length of the output
+  """
+  n_input_signal = len(input_signal)
+  n_fft = 2*(len(ir_fft)-1)
+  output_signal = create_sound(n_output_signal)
   for i_start in range(0,n_input_signal,n_fft//2):
     # extracting window and zero-padding
     i_end = min(i_start+n_fft//2,n_input_signal)
-    window_signal = input_signal[i_start:i_end]
+    window_signal = list(input_signal[i_start:i_end])
     window_signal.extend([0]*(n_fft-len(window_signal)))
     # FFT and multiplication
-    window_fft = analyse_fft(window_signal)
-    output_fft = [0]*n_fft
-    for i in range(n_fft):
-      output_fft[i] = window_fft[i]*ir_fft[i]
+    output_fft = list(map(operator.mul,analyse_rfft(window_signal),ir_fft))
     # back to time dimension and adding to the output
-    output_signal_2 = analyse_inverse_fft(output_fft)
+    output_signal_2 = analyse_inverse_rfft(output_fft,n_fft)
     i_end = min(i_start+n_fft,n_output_signal)
-    for i in range(i_start,i_end):
-      output_signal[i] += output_signal_2[i-i_start].real
+    output_signal[i_start:i_end] = as_sound(
+      map(operator.add,output_signal[i_start:i_end],output_signal_2))
+  return output_signal
+
+@accelerated
+def fast_convolve(input_signal,ir_signal):
+  n_input_signal = len(input_signal)
+  n_ir_signal = len(ir_signal)
+  n_output_signal = n_input_signal+n_ir_signal
+  # FFT size
+  n_fft = fast_convolve_size(n_ir_signal)
+  # real signals : half spectra only
+  ir_fft = analyse_rfft(list(ir_signal)+[0]*(n_fft-n_ir_signal))
+  return overlap_add_convolve(input_signal,ir_fft,n_output_signal)
+
+# PARALLEL CONVOLUTION
+# The input is split into segments convolved by a pool of processes, the
+# results being overlap-added. The data shared by all the segments (the IR
+# or its spectrum) is sent once to each process by the pool initializer,
+# with the backend of the caller : each segment is convolved as fast_convolve
+# would do it (one NumPy FFT per segment with the NumPy backend).
+
+worker_data = None
+
+def init_worker(backend,*data):
+  global worker_data
+  set_backend(backend)
+  worker_data = data
+
+def convolve_segment(segment):
+  ir_signal,ir_fft = worker_data
+  if get_backend()=='numpy':
+    return fast_convolve(segment,ir_signal)
+  return overlap_add_convolve(segment,ir_fft,len(segment)+len(ir_signal))
+
+def naively_convolve_segment(n_start,n_end):
+  input_signal,ir_signal = worker_data
+  return naively_convolve_range(input_signal,ir_signal,n_start,n_end)
+
+def parallel_convolve(input_signal,ir_signal,n_workers=0,n_segments=None):
+  """
+  Same output as fast_convolve, computed by a pool of processes
+  (fast_convolve itself if n_workers is 1)
+  --
+  Parameters :
+    input_signal : list of float
+    ir_signal : list of float (impulse response)
+    n_workers : number of processes (0 : as many as CPUs)
+    n_segments : number of segments of the input (4 per process if None)
+  Returns :
+    a compact sound
+  """
+  n_workers = n_workers or os.cpu_count()
+  if n_workers==1:
+    return fast_convolve(input_signal,ir_signal)
+  n_input_signal = len(input_signal)
+  n_ir_signal = len(ir_signal)
+  n_output_signal = n_input_signal+n_ir_signal
+  n_fft = fast_convolve_size(n_ir_signal)
+  ir_signal = as_sound(ir_signal)
+  # IR spectrum : only used by the pure Python backend
+  ir_fft = None
+  if get_backend()=='python':
+    ir_fft = analyse_rfft(list(ir_signal)+[0]*(n_fft-n_ir_signal))
+  # segments : multiples of the hop size (n_fft/2)
+  if n_segments is None:
+    n_segments = 4*n_workers
+  hop = n_fft//2
+  segment_size = hop*max(1,math.ceil(n_input_signal/hop/n_segments))
+  starts = range(0,n_input_signal,segment_size)
+  segments = [input_signal[i_start:i_start+segment_size] for i_start in starts]
+  output_signal = create_sound(n_output_signal)
+  with ProcessPoolExecutor(n_workers,initializer=init_worker,initargs=(get_backend(),ir_signal,ir_fft)) as pool:
+    # only the tail of the previous segment is added, the rest is copied
+    i_written = 0
+    for i_start,convolved in zip(starts,pool.map(convolve_segment,segments)):
+      i_end = min(i_start+len(convolved),n_output_signal)
+      i_overlap = min(i_written,i_end)
+      output_signal[i_start:i_overlap] = as_sound(
+        map(operator.add,output_signal[i_start:i_overlap],convolved))
+      output_signal[i_overlap:i_end] = as_sound(convolved[i_overlap-i_start:i_end-i_start])
+      i_written = i_end
+  return output_signal
+
+def parallel_naively_convolve(input_signal,ir_signal,n_workers=0,n_segments=None):
+  """
+  Same output as naively_convolve, output ranges being computed
+  by a pool of processes (see parallel_convolve)
+  """
+  n_workers = n_workers or os.cpu_count()
+  n_output_signal = len(input_signal)+len(ir_signal)
+  if n_segments is None:
+    n_segments = 4*n_workers
+  segment_size = max(1,math.ceil(n_output_signal/n_segments))
+  starts = list(range(0,n_output_signal,segment_size))
+  ends = [min(i_start+segment_size,n_output_signal) for i_start in starts]
+  output_signal = create_sound()
+  with ProcessPoolExecutor(n_workers,initializer=init_worker,initargs=(get_backend(),input_signal,ir_signal)) as pool:
+    for convolved in pool.map(naively_convolve_segment,starts,ends):
+      output_signal.extend(convolved)
+  return output_signal
+
+# Uniformly partitioned overlap-save convolution :
+# https://en.wikipedia.org/wiki/Overlap%E2%80%93save_method
+# The IR is split into P blocks of B samples whose spectra (FFT of size 2B)
+# are computed once. Each window of 2B input samples (previous and current
+# blocks) is transformed once and kept in a frequency-domain delay line :
+#   Y[k] = sum(X[k-p]*H[p]) for 0<=p<P
+# and the last B samples of the inverse FFT of Y[k] are the output block.
+# The sum over p>=1 is computed once per block, so that incomplete blocks
+# (zero-padded) can be output without latency.
+
+class Convolver:
+  """
+  Convolution by an impulse response, block by block
+  """
+  def __init__(self,ir_signal,block_size=1024):
+    """
+    Parameters :
+      ir_signal : list of float (impulse response)
+      block_size : size of the IR partitions (FFTs of size 2*block_size)
+    """
+    self.block_size = B = block_size
+    self.n_ir = len(ir_signal)
+    self.ir_spectra = []
+    for i_start in range(0,max(self.n_ir,1),B):
+      partition = list(ir_signal[i_start:i_start+B])
+      self.ir_spectra.append(analyse_rfft(partition+[0.0]*(2*B-len(partition))))
+    self.reset()
+
+  def reset(self):
+    B = self.block_size
+    self.previous_block = [0.0]*B
+    self.current_block = []
+    # spectra of the past windows, the most recent first
+    self.delay_line = deque(maxlen=len(self.ir_spectra)-1)
+    # sum(X[k-p]*H[p]) for p>=1
+    self.past_sum = [0j]*(B+1)
+
+  def process(self,block):
+    """
+    Parameters :
+      block : a list of float
+    Returns :
+      a compact sound, as long as block
+      (faster if block is a multiple of block_size)
+    """
+    B = self.block_size
+    output = []
+    i_start = 0
+    while i_start<len(block):
+      current_block = self.current_block
+      n = min(B-len(current_block),len(block)-i_start)
+      current_block.extend(block[i_start:i_start+n])
+      i_start += n
+      n_current = len(current_block)
+      window = self.previous_block+current_block+[0.0]*(B-n_current)
+      X = analyse_rfft(window)
+      Y = list(map(operator.add,self.past_sum,map(operator.mul,X,self.ir_spectra[0])))
+      output.extend(analyse_inverse_rfft(Y,2*B)[B+n_current-n:B+n_current])
+      if n_current==B:
+        self.previous_block = current_block
+        self.current_block = []
+        if self.delay_line.maxlen>0:
+          self.delay_line.appendleft(X)
+          past_sum = [0j]*(B+1)
+          for X_past,H in zip(self.delay_line,self.ir_spectra[1:]):
+            past_sum = list(map(operator.add,past_sum,map(operator.mul,X_past,H)))
+          self.past_sum = past_sum
+    return as_sound(output)
+
+  def flush(self):
+    """
+    Returns :
+      the end of the convolution (as long as the IR)
+    """
+    return self.process(create_sound(self.n_ir))
+
+def partitioned_convolve(input_signal,ir_signal,block_size=1024):
+  """
+  Same output as fast_convolve, FFT size only depending on block_size
+  (see Convolver)
+  """
+  convolver = Convolver(ir_signal,block_size)
+  output_signal = convolver.process(input_signal)
+  output_signal.extend(convolver.flush())
   return output_signal
 
 # TIME EFFECTS
@@ -346,17 +1088,168 @@ def apply_delay(sound,delay):
   Parameters :
     sound : list of float
     delay : list of delays (in ms)
+      or AutomationCurve (evaluated block by block)
   """
-  sample_rate = 44100
+  sampling_rate = get_sampling_rate()
   n_samples = len(sound)
-  output = [0 for _ in range(n_samples)]
-  for i in range(n_samples):
-    sample = i-sample_rate*value_at_sample(delay,i)/1000
-    output[i] = interpolate_at_sample(sound,sample)
-  return output
+  if isinstance(delay,AutomationCurve):
+    output = create_sound()
+    i_start = 0
+    for block in delay.blocks(n_samples):
+      samples = [i-sampling_rate*d/1000 for i,d in zip(range(i_start,n_samples),block)]
+      output.extend(interpolate_at_samples(sound,samples))
+      i_start += len(block)
+    return output
+  # no delay after the end of the delay list
+  samples = [i-sampling_rate*d/1000 for i,d in zip(range(n_samples),delay)]
+  samples.extend(range(len(samples),n_samples))
+  return interpolate_at_samples(sound,samples)
+
+# DELAY LINE
+# Circular buffer of the last samples, read at a fractional position :
+#   linear : 2 samples
+#   cubic : 4 samples (Catmull-Rom spline, delay of at least 1 sample)
+#     https://en.wikipedia.org/wiki/Cubic_Hermite_spline
+#   allpass : 2 samples and one state, flat magnitude response but only
+#     suited to slowly varying delays
+#     https://ccrma.stanford.edu/~jos/pasp/First_Order_Allpass_Interpolation.html
+# The delay (in ms) is either constant, modulated by an LFO (chorus,
+# flanger...) or given for each sample as a control signal.
+
+lfo_waveforms = {
+  'sine': lambda phase:math.sin(2*math.pi*phase),
+  'triangle': lambda phase:1-4*abs(phase-0.5),
+  'sawtooth': lambda phase:2*phase-1,
+  'square': lambda phase:1.0 if phase<0.5 else -1.0
+}
+
+class DelayLine:
+  """
+  Fractional delay line keeping its state between successive blocks
+  """
+  def __init__(self,delay,depth=0,rate=0,waveform='sine',
+               interpolation='linear',feedback=0.0,max_delay=None):
+    """
+    Parameters :
+      delay : delay (in ms), centre of the modulation,
+        constant or AutomationCurve
+      depth : amplitude of the modulation (in ms)
+      rate : frequency of the modulation (in Hz)
+      waveform : 'sine', 'triangle', 'sawtooth' or 'square'
+      interpolation : 'linear', 'cubic' or 'allpass'
+      feedback : part of the output fed back into the line
+      max_delay : longest delay (in ms), delay+depth if None
+        (longer delays of control signals are clamped)
+    """
+    assert interpolation in ('linear','cubic','allpass')
+    assert waveform in lfo_waveforms
+    self.sampling_rate = get_sampling_rate()
+    # constant delay or AutomationCurve (evaluated block after block) :
+    # the curve is copied, the position of the caller's one is not changed
+    if isinstance(delay,AutomationCurve):
+      delay = AutomationCurve(list(zip(delay.times,delay.values)),delay.shapes)
+    self.delay = delay
+    self.depth = depth
+    self.rate = rate
+    self.waveform = waveform
+    self.interpolation = interpolation
+    self.feedback = feedback
+    if max_delay is None:
+      if isinstance(delay,AutomationCurve):
+        max_delay = max(delay.values)+depth
+      else:
+        max_delay = delay+depth
+    self.max_delay = max_delay*self.sampling_rate/1000
+    self.min_delay = 1.0 if interpolation=='cubic' else 0.0
+    self.reset()
+
+  def reset(self):
+    # empty line, LFO and delay curve rewound
+    self.buffer = [0.0]*(math.ceil(self.max_delay)+4)
+    self.i_write = 0
+    self.phase = 0.0
+    # previous output of the allpass interpolation
+    self.state = 0.0
+    if isinstance(self.delay,AutomationCurve):
+      self.delay.reset()
+
+  def lfo_delays(self,n_samples):
+    """
+    Returns :
+      list of n_samples delays (in ms) of the LFO, starting at its phase
+    """
+    if isinstance(self.delay,AutomationCurve):
+      centres = self.delay.next_block(n_samples)
+    else:
+      centres = [self.delay]*n_samples
+    if self.depth==0 or self.rate==0:
+      return centres
+    waveform = lfo_waveforms[self.waveform]
+    phase_step = self.rate/self.sampling_rate
+    phase = self.phase
+    delays = [centre+self.depth*waveform((phase+k*phase_step)%1) for k,centre in enumerate(centres)]
+    self.phase = (phase+n_samples*phase_step)%1
+    return delays
+
+  def process(self,block,delays=None):
+    """
+    Parameters :
+      block : a list of float
+      delays : None (constant or LFO delay) or a control signal :
+        list of delays (in ms), one per sample of block, or AutomationCurve
+    Returns :
+      a compact sound, the delayed block
+    """
+    if delays is None:
+      delays = self.lfo_delays(len(block))
+    elif isinstance(delays,AutomationCurve):
+      delays = delays.next_block(len(block))
+    assert len(delays)==len(block)
+    buffer = self.buffer
+    size = len(buffer)
+    i_write = self.i_write
+    feedback = self.feedback
+    interpolation = self.interpolation
+    state = self.state
+    # delays in samples, within bounds
+    scale = self.sampling_rate/1000
+    min_delay,max_delay = self.min_delay,self.max_delay
+    delays = [min(max(delay*scale,min_delay),max_delay) for delay in delays]
+    output = []
+    for x,delay in zip(block,delays):
+      i_write += 1
+      if i_write==size:
+        i_write = 0
+      buffer[i_write] = x
+      position = i_write-delay+size
+      i = int(position)
+      fraction = position-i
+      if i>=size:
+        i -= size
+      i_next = i+1 if i+1<size else 0
+      if interpolation=='linear':
+        y = buffer[i]+fraction*(buffer[i_next]-buffer[i])
+      elif interpolation=='cubic':
+        p0,p1,p2,p3 = buffer[i-1],buffer[i],buffer[i_next],buffer[i_next+1-size]
+        y = p1+0.5*fraction*(p2-p0+fraction*(2*p0-5*p1+4*p2-p3+fraction*(3*(p1-p2)+p3-p0)))
+      else:
+        # integer delay M and fraction 1-fraction : (eta+z^-1)/(1+eta.z^-1)
+        eta = fraction/(2-fraction)
+        y = eta*(buffer[i_next]-state)+buffer[i]
+        state = y
+      if feedback!=0:
+        buffer[i_write] += feedback*y
+      output.append(y)
+    self.i_write = i_write
+    self.state = state
+    return as_sound(output)
+
+  def flush(self):
+    """
+    Returns :
+      the samples still in the line (max_delay long)
+    """
+    return self.process(create_sound(math.ceil(self.max_delay)))
 
 def change_speed(sound,ratio):
-  output = [0]*int(len(sound)/ratio)
-  for i in range(len(output)):
-    output[i] = interpolate_at_sample(sound,i*ratio)
-  return output
+  return resample(sound,ratio)
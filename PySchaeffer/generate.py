@@ -1,6 +1,7 @@
 import math,random
 from PySchaeffer.base import *
 from PySchaeffer.effects import *
+from PySchaeffer.backend import accelerated
 
 # SOUND GENERATORS
 ##################
@@ -11,29 +12,30 @@ def generate_constant(duration,value=0.0):
     duration : in ms
     value : a float
   Returns :
-    a list of float
+    a compact sound
   """
-  sampling_rate = 44100
-  return [value for _ in range((duration*sampling_rate)//1000)]
+  sampling_rate = get_sampling_rate()
+  return create_sound((duration*sampling_rate)//1000,value)
 
 def generate_white_noise(duration):
-  sampling_rate = 44100
-  return [random.random()*2-1 for _ in range((duration*sampling_rate)//1000)]
+  sampling_rate = get_sampling_rate()
+  return as_sound(random.random()*2-1 for _ in range((duration*sampling_rate)//1000))
 
+@accelerated
 def generate_sine(duration,frequency):
   """
   Parameters :
     duration : in ms
     frequency : in hz
   Returns :
-    a list of float
+    a compact sound
   """
-  sampling_rate = 44100
-  return [math.sin(2*math.pi*frequency*i/sampling_rate) for i in range((duration*sampling_rate)//1000)]
+  sampling_rate = get_sampling_rate()
+  return as_sound(math.sin(2*math.pi*frequency*i/sampling_rate) for i in range((duration*sampling_rate)//1000))
 
 def generate_pwm(duration,frequency,duty=0.5):
   # https://en.wikipedia.org/wiki/Pulse-width_modulation
-  sampling_rate = 44100
+  sampling_rate = get_sampling_rate()
   sound = generate_constant(duration,0)
   for i in range(len(sound)):
     n_cycles = int(i/sampling_rate*frequency)
@@ -54,41 +56,57 @@ def generate_additive_synthesis(duration,frequency,amplitudes):
     ...
   Returns
   -------
-  a list of float
+  a compact sound
   """
-  sound = []
+  mixer = Mixer()
   for i in range(len(amplitudes)):
     freq = frequency*(i+1)
-    harmonic = generate_sine(duration,freq)
-    harmonic = amplify(harmonic,amplitudes[i])
-    sound = add_sound(sound,harmonic,0)
-  return sound
+    mixer.add(generate_sine(duration,freq),0,amplitudes[i])
+  return mixer.render()
 
 
 # Fréquency modulation
 ######################
 
-def generate_phasor(frequency):
-  n = len(frequency)
-  sampling_rate = 44100
-  phase = [0]*n
-  for i in range(1,n):
-    phase[i] = phase[i-1]+2*math.pi*frequency[i]/sampling_rate
-    if phase[i]>2*math.pi:
-      phase[i] -= 2*math.pi
+def generate_phasor(frequency,duration=None):
+  """
+  Parameters :
+    frequency : list of frequencies (in Hz, one per sample)
+      or AutomationCurve (evaluated block by block)
+    duration : in ms, for an AutomationCurve (its duration if None)
+  Returns :
+    a compact sound (phase between 0 and 2*pi)
+  """
+  sampling_rate = get_sampling_rate()
+  if isinstance(frequency,AutomationCurve):
+    n = frequency.n_samples(duration)
+    blocks = frequency.blocks(n)
+  else:
+    n = len(frequency)
+    blocks = [frequency]
+  phase = create_sound(n)
+  i = 0
+  value = 0.0
+  for block in blocks:
+    for f in block:
+      if i>0:
+        value = value+2*math.pi*f/sampling_rate
+        if value>2*math.pi:
+          value -= 2*math.pi
+        phase[i] = value
+      i += 1
   return phase
 
-def generate_modulated_sine(frequency):
-  phase = generate_phasor(frequency)
-  n = len(phase)
-  return [math.sin(phase[i]) for i in range(n)]
+def generate_modulated_sine(frequency,duration=None):
+  phase = generate_phasor(frequency,duration)
+  return as_sound(map(math.sin,phase))
 
-def generate_from_wavetable(frequency,table):
+def generate_from_wavetable(frequency,table,duration=None):
   # https://en.wikipedia.org/wiki/Wavetable_synthesis
-  phase = generate_phasor(frequency)
+  phase = generate_phasor(frequency,duration)
   n = len(phase)
   n_table = len(table)
-  return [interpolate_at_sample(table,phase[i]/2/math.pi*n_table,True) for i in range(n)]
+  return interpolate_at_samples(table,[phase[i]/2/math.pi*n_table for i in range(n)],True)
 
 # MISCELLANEOUS
 ###############
@@ -97,11 +115,11 @@ def generate_karplus_strong(duration,frequency):
   """
   https://en.wikipedia.org/wiki/Karplus%E2%80%93Strong_string_synthesis
   """
-  sampling_rate = 44100
+  sampling_rate = get_sampling_rate()
   delay = int(sampling_rate/frequency)
   n_samples = int(duration*sampling_rate/1000)
-  sound = [random.random()*2-1 for _ in range(min(delay,n_samples))]
-  sound.extend([0]*max(0,n_samples-delay))
+  sound = as_sound([random.random()*2-1 for _ in range(min(delay,n_samples))])
+  sound.extend(create_sound(max(0,n_samples-delay)))
   for i in range(delay,n_samples):
     sound[i] = (sound[i-delay]+sound[i-delay+1])*0.5
   return sound
@@ -115,9 +133,9 @@ def generate_dtmf(message,tone_duration=150,silence_duration=100):
   message : a str (i.e. : '60893A#*')
   Returns
   -------
-  a list of float
+  a compact sound
   """
-  sound = []
+  mixer = Mixer()
   #       	1209 Hz 	1336 Hz 	1477 Hz 	1633 Hz
   # 697 Hz 	1 	      2 	      3 	      A
   # 770 Hz 	4 	      5 	      6 	      B
@@ -136,9 +154,9 @@ def generate_dtmf(message,tone_duration=150,silence_duration=100):
     else:
       time = i*(tone_duration+silence_duration)
       freq1,freq2 = frequencies[char]
-      sound = add_sound(sound,generate_sine(tone_duration,freq1),time)
-      sound = add_sound(sound,generate_sine(tone_duration,freq2),time)
-  return amplify(sound,0.5)
+      mixer.add(generate_sine(tone_duration,freq1),time,0.5)
+      mixer.add(generate_sine(tone_duration,freq2),time,0.5)
+  return mixer.render()
 
 def generate_morse_code(message,unit=75,tone=700):
   morse_code = {
@@ -151,7 +169,7 @@ def generate_morse_code(message,unit=75,tone=700):
     '6':'_....','7':'__...','8':'___..','9':'____.','0':'_____',
   }
   durations = {'.':1,'_':3}
-  sound = []
+  sound = create_sound()
   for char in message:
     if char==' ':
       # already 3 units of silence after a letter -> 7 units
@@ -1,102 +1,577 @@
 #!/usr/bin/python3
-import struct
+import math,mmap,struct,sys
+from array import array
+from PySchaeffer.base import create_sound,as_sound,resample,interpolate_at_samples,Resampler,get_sampling_rate,get_output_sampling_rate
 
-def read_wav(filename,channel=0):
+# WAV utils
+###########
+
+def wav_read_header(f):
   """
-  Reads a WAV file
+  Reads the RIFF/WAVE header of an opened file,
+  skipping unknown chunks until the 'data' chunk is reached
   Parameters
   ----------
-  filename : file name
-  channel : the channel to be return, default is 0 (left)
+  f : a file opened in binary mode (at its beginning)
   Returns
   -------
-  sound : list of float (between -1.0 and 1.0)
+  a tuple (audio_format,n_channels,sampling_rate,bits_per_sample,n_bytes)
+    audio_format : 1 (PCM) or 3 (IEEE float)
+    n_bytes : size of the 'data' chunk, f is positioned at its beginning
   """
   # WAV is little endian, so struct format is '<'
-  f = open(filename, 'rb')
-  # 'RIFF' block
-  assert 'RIFF'==struct.unpack('<4s',f.read(4))[0].decode('UTF-8')
+  # 'RIFF' block ('RF64' for files larger than 4GB)
+  assert struct.unpack('<4s',f.read(4))[0].decode('UTF-8') in ['RIFF','RF64']
   struct.unpack('<L',f.read(4))[0]
   assert 'WAVE'==struct.unpack('<4s',f.read(4))[0].decode('UTF-8')
-  # 'fmt ' block
-  assert 'fmt '==struct.unpack('<4s',f.read(4))[0].decode('UTF-8')
-  fmt_size_n = struct.unpack('<L',f.read(4))[0]      # block size = 16
-  assert 1==struct.unpack('<H',f.read(2))[0]         # PCM format
-  n_channels = struct.unpack('<H',f.read(2))[0]      # number of channels
-  sampling_rate = struct.unpack('<L',f.read(4))[0]   # number of samples per second
-  byte_rate = struct.unpack('<L',f.read(4))[0]       # number of bytes per second
-  alignment = struct.unpack('<H',f.read(2))[0]       # block alignment
-  bits_per_sample = struct.unpack('<H',f.read(2))[0] # number of bits per sample
+  audio_format = None
+  ds64_data_size = None
+  while True:
+    chunk_header = f.read(8)
+    assert len(chunk_header)==8, 'No \'data\' chunk found'
+    chunk_id,chunk_size = struct.unpack('<4sL',chunk_header)
+    chunk_id = chunk_id.decode('UTF-8')
+    if chunk_id=='fmt ':
+      (audio_format,              # PCM format
+       n_channels,                # number of channels
+       sampling_rate,             # number of samples per second
+       byte_rate,                 # number of bytes per second
+       alignment,                 # block alignment
+       bits_per_sample            # number of bits per sample
+      ) = struct.unpack('<HHLLHH',f.read(16))
+      # extra 'fmt ' data
+      extra = f.read(chunk_size-16+chunk_size%2)
+      if audio_format==0xFFFE:
+        # WAVE_FORMAT_EXTENSIBLE : actual format in the sub-format GUID
+        audio_format = struct.unpack('<H',extra[8:10])[0]
+    elif chunk_id=='ds64':
+      # RF64 : actual 64 bit sizes
+      ds64 = f.read(chunk_size+chunk_size%2)
+      ds64_data_size = struct.unpack('<Q',ds64[8:16])[0]
+    elif chunk_id=='data':
+      assert audio_format is not None, 'No \'fmt \' chunk before \'data\''
+      if chunk_size==0xFFFFFFFF and ds64_data_size is not None:
+        chunk_size = ds64_data_size
+      break
+    else:
+      # unknown chunk (LIST, fact, ...) : skipped (with padding byte)
+      f.seek(chunk_size+chunk_size%2,1)
+  n_bytes = chunk_size # total number of bytes
   # check ' fmt' header
-  assert bits_per_sample in [16,24,32], f'Unimplemented sample size {bits_per_sample}'
+  assert audio_format in [1,3], f'Unimplemented audio format {audio_format}'
+  if audio_format==1:
+    assert bits_per_sample in [16,24,32], f'Unimplemented sample size {bits_per_sample}'
+  else:
+    assert bits_per_sample in [32,64], f'Unimplemented sample size {bits_per_sample}'
   if ((bits_per_sample//8*n_channels)!=alignment
      or byte_rate!=sampling_rate*alignment):
     print('/!\\Warning /!\\ Inconsistent header')
-  if sampling_rate!=44100:
-    print('/!\\Warning /!\\ Sampling frequency is not 44100')
-  # extra 'fmt ' data
-  for i in range(fmt_size_n-16):
-    struct.unpack('<B',f.read(1))[0]
-  # 'data' block
-  assert 'data'==struct.unpack('<4s',f.read(4))[0].decode('UTF-8')
-  n_bytes = struct.unpack('<L',f.read(4))[0] # total number of bytes
-  n_samples = n_bytes//(n_channels*bits_per_sample//8)
-  sound = [0]*n_samples
-  for i in range(n_samples):
-    for i_channel in range(n_channels):
-      if bits_per_sample==16:
-        sample = struct.unpack('<h',f.read(2))[0]
-      elif bits_per_sample==24:
-        b = f.read(3)
-        sample = struct.unpack('<i',b+(b'\0' if b[2]<128 else b'\xff'))[0]
-      elif bits_per_sample==32:
-        sample = struct.unpack('<l',f.read(4))[0]
-      if i_channel==channel:
-        sound[i] = sample/(2**(bits_per_sample-1))
-  f.close()
+  return audio_format,n_channels,sampling_rate,bits_per_sample,n_bytes
+
+def wav_decode_samples(data,audio_format,bits_per_sample,n_channels,channel=0):
+  """
+  Decodes a whole block of interleaved WAV samples at once
+  Parameters
+  ----------
+  data : bytes-like object (content of the 'data' chunk, or a part of it
+    starting on a frame boundary)
+  audio_format : 1 (PCM) or 3 (IEEE float)
+  bits_per_sample : 16, 24, 32 (PCM) or 32, 64 (float)
+  n_channels : number of interleaved channels
+  channel : the channel to be returned
+  Returns
+  -------
+  sound : a compact sound (between -1.0 and 1.0)
+  """
+  assert 0<=channel<n_channels, f'No channel {channel} in a {n_channels} channel(s) file'
+  bytes_per_sample = bits_per_sample//8
+  alignment = n_channels*bytes_per_sample
+  n_samples = len(data)//alignment
+  data = memoryview(data)[:n_samples*alignment]
+  if audio_format==1 and bits_per_sample==24:
+    # no 24 bit array type : the 3 bytes of each sample of the channel
+    # are moved into the upper part of an int32 (lower byte is 0)
+    offset = channel*bytes_per_sample
+    widened = bytearray(4*n_samples)
+    for i in range(3):
+      widened[i+1::4] = data[offset+i::alignment]
+    data = widened
+    typecode,n_channels,channel = 'i',1,0
+    scale = 1/2**31
+  elif audio_format==1:
+    typecode = {16:'h',32:'i'}[bits_per_sample]
+    scale = 1/2**(bits_per_sample-1)
+  else:
+    typecode = {32:'f',64:'d'}[bits_per_sample]
+    scale = 1.0
+  samples = array(typecode)
+  samples.frombytes(data)
+  if sys.byteorder=='big':
+    samples.byteswap()
+  # deinterleaving by stride
+  if n_channels>1:
+    samples = samples[channel::n_channels]
+  if scale==1.0:
+    return as_sound(samples)
+  return as_sound(map(scale.__mul__,samples))
+
+def wav_encode_samples(channels,audio_format=1,bits_per_sample=16):
+  """
+  Encodes whole blocks of samples at once, interleaving channels
+  Parameters
+  ----------
+  channels : list of sounds (list of float), one per channel, same length
+    PCM : values between -1.0 and 1.0, clipped if needed
+    float : values written as is
+  audio_format : 1 (PCM) or 3 (IEEE float)
+  bits_per_sample : 16, 24, 32 (PCM) or 32, 64 (float)
+  Returns
+  -------
+  bytes (content of the 'data' chunk)
+  """
+  bytes_per_sample = bits_per_sample//8
+  n_channels = len(channels)
+  n_samples = len(channels[0])
+  channels_bytes = []
+  for sound in channels:
+    assert len(sound)==n_samples, 'All channels should have the same length'
+    if audio_format==1:
+      min_value = -2**(bits_per_sample-1)
+      max_value = 2**(bits_per_sample-1)-1
+      scale = float(2**(bits_per_sample-1))
+      samples = list(map(int,map(scale.__mul__,sound)))
+      # clipping only if needed
+      if len(samples)>0 and (max(samples)>max_value or min(samples)<min_value):
+        samples = [min(max_value,max(min_value,sample)) for sample in samples]
+      samples = array('h' if bits_per_sample==16 else 'i',samples)
+      if bits_per_sample==24:
+        # moved into the upper part of an int32 (lower byte is dropped)
+        samples = array('i',[sample<<8 for sample in samples])
+    else:
+      samples = array({32:'f',64:'d'}[bits_per_sample],sound)
+    if sys.byteorder=='big':
+      samples.byteswap()
+    channels_bytes.append(samples.tobytes())
+  width = samples.itemsize
+  if n_channels==1 and width==bytes_per_sample:
+    return channels_bytes[0]
+  # interleaving by stride (byte per byte)
+  alignment = n_channels*bytes_per_sample
+  data = bytearray(n_samples*alignment)
+  for i_channel,channel_bytes in enumerate(channels_bytes):
+    for i in range(bytes_per_sample):
+      i_byte = i+width-bytes_per_sample
+      data[i_channel*bytes_per_sample+i::alignment] = channel_bytes[i_byte::width]
+  return bytes(data)
+
+# WAV I/O
+#########
+
+def read_wav(filename,channel=0):
+  """
+  Reads a WAV file
+  Parameters
+  ----------
+  filename : file name
+  channel : the channel to be return, default is 0 (left)
+  Returns
+  -------
+  sound : a compact sound (between -1.0 and 1.0),
+    resampled to the current sampling rate (see draft_mode)
+  """
+  with open(filename,'rb') as f:
+    audio_format,n_channels,sampling_rate,bits_per_sample,n_bytes = wav_read_header(f)
+    data = f.read(n_bytes)
+  sound = wav_decode_samples(data,audio_format,bits_per_sample,n_channels,channel)
+  if sampling_rate!=get_sampling_rate():
+    sound = resample(sound,sampling_rate/get_sampling_rate())
   return sound
 
-def write_wav(filename,sound):
+def write_wav(filename,sound,bits_per_sample=16,is_float=False):
   """
-  Writes a mono WAV file
+  Writes a WAV file
+  (RF64 is used if the file is larger than 4GB)
+  The file is written at the output sampling rate :
+  sound is upsampled if rendered at a lower rate (see draft_mode)
   Parameters
   ----------
   filename : file name
   sound : list of float (between -1.0 and 1.0, clipped if needed)
+    or a tuple of lists of float, one per channel (multichannel file)
+  bits_per_sample : 16, 24, 32 (PCM) or 32, 64 (float)
+  is_float : IEEE float samples instead of PCM (not clipped)
   Returns
   -------
   None
   """
-  # TODO : stereo???
-  # prepare writing :
-  n_channels = 1
-  sampling_rate = 44100
-  n_samples = len(sound)
-  bytes_per_sample = 2 # 16bit PCM
-  byte_rate = n_channels*sampling_rate*bytes_per_sample
-  n_bytes = n_channels*n_samples*bytes_per_sample
-  # WAV is little endian, so struct format is '<'
-  f = open(filename, 'wb')
-  # 'RIFF' block
-  f.write(struct.pack('<4s','RIFF'.encode('UTF-8')))
-  f.write(struct.pack('<L',36+n_bytes)) # header_size-8 = 36
-  f.write(struct.pack('<4s','WAVE'.encode('UTF-8')))
-  # 'fmt ' block
-  f.write(struct.pack('<4s','fmt '.encode('UTF-8')))
-  f.write(struct.pack('<L',16))                          # block size = 16
-  f.write(struct.pack('<H',1))                           # PCM format = 1
-  f.write(struct.pack('<H',n_channels))                  # number of channel
-  f.write(struct.pack('<L',sampling_rate))               # number of samples per second
-  f.write(struct.pack('<L',byte_rate))                   # number of bytes per second
-  f.write(struct.pack('<H',bytes_per_sample*n_channels)) # block alignment
-  f.write(struct.pack('<H',8*bytes_per_sample))          # number of bits per sample
-  # 'data' block
-  f.write(struct.pack('<4s','data'.encode('UTF-8')))
-  f.write(struct.pack('<L',n_bytes)) # total number of bytes
-  #
-  min_value = -2**15
-  max_value = 2**15-1
-  for sample in sound:
-    q_sample = min(max_value,max(min_value,int(sample*2**15)))
-    f.write(struct.pack('<h',q_sample))
-  f.close()
+  if isinstance(sound,tuple):
+    channels = sound
+  else:
+    channels = (sound,)
+  sampling_rate = get_sampling_rate()
+  output_sampling_rate = get_output_sampling_rate()
+  if output_sampling_rate!=sampling_rate:
+    channels = tuple(resample(channel,sampling_rate/output_sampling_rate) for channel in channels)
+  n_samples = len(channels[0])
+  block_size = 65536
+  with WavWriter(filename,len(channels),output_sampling_rate,bits_per_sample,
+                 is_float,n_samples,output_sampling_rate) as writer:
+    for i_start in range(0,n_samples,block_size):
+      writer.write(tuple(channel[i_start:i_start+block_size] for channel in channels))
+
+# WAV STREAMING
+###############
+
+class WavReader:
+  """
+  Incremental WAV reader : only one block of samples is held in memory
+  (samples are resampled to the current sampling rate, see draft_mode)
+  Usage :
+    with WavReader('in.wav') as reader:
+      for block in reader:
+        ...
+  Parameters
+  ----------
+  filename : file name
+  channel : the channel to be read, default is 0 (left)
+  block_size : number of samples per block (when iterating)
+  """
+  def __init__(self,filename,channel=0,block_size=4096):
+    self.file = open(filename,'rb')
+    (self.audio_format,self.n_channels,self.sampling_rate,
+     self.bits_per_sample,n_bytes) = wav_read_header(self.file)
+    assert 0<=channel<self.n_channels, f'No channel {channel} in a {self.n_channels} channel(s) file'
+    self.channel = channel
+    self.block_size = block_size
+    self.alignment = self.n_channels*self.bits_per_sample//8
+    # frames of the file
+    self.n_frames = n_bytes//self.alignment
+    self.i_frame = 0
+    if self.sampling_rate==get_sampling_rate():
+      self.resampler = None
+      self.n_samples = self.n_frames
+    else:
+      self.resampler = Resampler(self.sampling_rate/get_sampling_rate())
+      self.n_samples = int(self.n_frames/self.resampler.ratio)
+      self.resampled = create_sound()
+
+  def __len__(self):
+    return self.n_samples
+
+  def read_frames(self,n_frames):
+    """
+    Returns
+    -------
+    a compact sound, the next n_frames samples of the file (not resampled)
+    """
+    n_frames = min(n_frames,self.n_frames-self.i_frame)
+    data = self.file.read(n_frames*self.alignment)
+    # truncated file : only complete frames are kept
+    self.i_frame += len(data)//self.alignment
+    return wav_decode_samples(data,self.audio_format,self.bits_per_sample,
+                              self.n_channels,self.channel)
+
+  def read(self,n_samples=None):
+    """
+    Parameters
+    ----------
+    n_samples : max number of samples to be read (block_size if None)
+    Returns
+    -------
+    a compact sound, empty at the end of the file
+    """
+    if n_samples is None:
+      n_samples = self.block_size
+    if self.resampler is None:
+      return self.read_frames(n_samples)
+    while len(self.resampled)<n_samples and self.resampler is not None:
+      frames = self.read_frames(self.block_size)
+      if len(frames)>0:
+        self.resampled.extend(self.resampler.process(frames))
+      else:
+        self.resampled.extend(self.resampler.flush())
+        self.resampler = None
+    block = self.resampled[:n_samples]
+    del self.resampled[:n_samples]
+    return block
+
+  def __iter__(self):
+    block = self.read()
+    while len(block)>0:
+      yield block
+      block = self.read()
+
+  def close(self):
+    self.file.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self,*args):
+    self.close()
+
+class WavWriter:
+  """
+  Incremental WAV writer :
+  blocks are written as soon as they are given,
+  RIFF and 'data' sizes are patched when closing.
+  Unless a small enough n_samples is announced, room is reserved
+  (JUNK chunk) for switching to RF64 if the file exceeds 4GB.
+  Usage :
+    with WavWriter('out.wav') as writer:
+      for block in blocks:
+        writer.write(block)
+  Parameters
+  ----------
+  filename : file name
+  n_channels : number of channels
+  sampling_rate : number of samples per second of the file
+    (output sampling rate if None, see draft_mode)
+  bits_per_sample : 16, 24, 32 (PCM) or 32, 64 (float)
+  is_float : IEEE float samples instead of PCM
+  n_samples : expected number of samples per channel in the file (if known)
+  input_sampling_rate : sampling rate of the written blocks
+    (current rate if None), resampled to sampling_rate if different
+  """
+  max_riff_size = 0xFFFFFFFF
+
+  def __init__(self,filename,n_channels=1,sampling_rate=None,
+               bits_per_sample=16,is_float=False,n_samples=None,
+               input_sampling_rate=None):
+    if sampling_rate is None:
+      sampling_rate = get_output_sampling_rate()
+    if input_sampling_rate is None:
+      input_sampling_rate = get_sampling_rate()
+    if input_sampling_rate==sampling_rate:
+      self.resamplers = None
+    else:
+      self.resamplers = [Resampler(input_sampling_rate/sampling_rate) for _ in range(n_channels)]
+    self.audio_format = 3 if is_float else 1
+    if is_float:
+      assert bits_per_sample in [32,64], f'Unimplemented sample size {bits_per_sample}'
+    else:
+      assert bits_per_sample in [16,24,32], f'Unimplemented sample size {bits_per_sample}'
+    self.n_channels = n_channels
+    self.sampling_rate = sampling_rate
+    self.bits_per_sample = bits_per_sample
+    self.alignment = n_channels*bits_per_sample//8
+    self.n_samples = 0
+    # JUNK chunk : room for a 'ds64' chunk (RF64)
+    self.is_rf64_ready = (n_samples is None
+      or 36+n_samples*self.alignment+1>self.max_riff_size)
+    # WAV is little endian, so struct format is '<'
+    self.file = open(filename,'wb')
+    self.file.write(struct.pack('<4sL4s',b'RIFF',0,b'WAVE')) # size patched on close
+    if self.is_rf64_ready:
+      self.file.write(struct.pack('<4sL',b'JUNK',28)+bytes(28))
+    self.file.write(struct.pack('<4sLHHLLHH',b'fmt ',16,
+      self.audio_format,                 # PCM format = 1, float = 3
+      n_channels,                        # number of channel
+      sampling_rate,                     # number of samples per second
+      sampling_rate*self.alignment,      # number of bytes per second
+      self.alignment,                    # block alignment
+      bits_per_sample))                  # number of bits per sample
+    self.file.write(struct.pack('<4sL',b'data',0)) # size patched on close
+    self.data_start = self.file.tell()
+
+  def write(self,block):
+    """
+    Parameters
+    ----------
+    block : list of float
+      or a tuple of lists of float, one per channel (multichannel file)
+      PCM : values between -1.0 and 1.0, clipped if needed
+    """
+    if not isinstance(block,tuple):
+      block = (block,)
+    assert len(block)==self.n_channels, f'{len(block)} channel(s) given, {self.n_channels} expected'
+    if self.resamplers is not None:
+      block = tuple(resampler.process(channel) for resampler,channel in zip(self.resamplers,block))
+    self.write_frames(block)
+
+  def write_frames(self,block):
+    self.file.write(wav_encode_samples(block,self.audio_format,self.bits_per_sample))
+    self.n_samples += len(block[0])
+
+  def close(self):
+    if self.file.closed:
+      return
+    if self.resamplers is not None:
+      self.write_frames(tuple(resampler.flush() for resampler in self.resamplers))
+      self.resamplers = None
+    n_bytes = self.n_samples*self.alignment
+    if n_bytes%2==1:
+      self.file.write(b'\0') # padding byte
+    riff_size = self.data_start-8+n_bytes+n_bytes%2
+    if riff_size<=self.max_riff_size:
+      self.file.seek(4)
+      self.file.write(struct.pack('<L',riff_size))
+      self.file.seek(self.data_start-4)
+      self.file.write(struct.pack('<L',n_bytes))
+    else:
+      assert self.is_rf64_ready, 'Data larger than announced'
+      # RF64 : sizes in 'ds64', 32 bit sizes set to -1
+      self.file.seek(0)
+      self.file.write(struct.pack('<4sL',b'RF64',0xFFFFFFFF))
+      self.file.seek(12)
+      self.file.write(struct.pack('<4sLQQQL',b'ds64',28,riff_size,n_bytes,self.n_samples,0))
+      self.file.seek(self.data_start-4)
+      self.file.write(struct.pack('<L',0xFFFFFFFF))
+    self.file.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self,*args):
+    self.close()
+
+def read_wav_blocks(filename,channel=0,block_size=4096):
+  """
+  Generator version of WavReader, for pipelines :
+    write_wav_blocks('out.wav',(amplify(block,0.5) for block in read_wav_blocks('in.wav')))
+  Yields
+  ------
+  lists of float (at most block_size samples)
+  """
+  with WavReader(filename,channel,block_size) as reader:
+    yield from reader
+
+def write_wav_blocks(filename,blocks,n_channels=1,bits_per_sample=16,is_float=False):
+  """
+  Writes a WAV file from an iterable of blocks
+  (list of float, or tuple of lists of float if multichannel)
+  at the output sampling rate, as write_wav (see WavWriter)
+  Returns
+  -------
+  the number of samples written (per channel)
+  """
+  with WavWriter(filename,n_channels,bits_per_sample=bits_per_sample,
+                 is_float=is_float) as writer:
+    for block in blocks:
+      writer.write(block)
+  return writer.n_samples
+
+# WAV MEMORY MAPPING
+####################
+
+class WavView:
+  """
+  Read-only sound backed by a memory-mapped WAV file :
+  samples are decoded on demand, so opening is cheap and only
+  the accessed pages are loaded in memory.
+  Behaves as a list of float for len(), indexing and slicing
+  (slices are decoded into compact sounds), so it can be
+  given to add_sound, value_at_sample, interpolate_at_sample, ...
+  Files at another sampling rate are seen resampled to the current rate
+  (see draft_mode), accessed samples being interpolated on demand.
+  Parameters
+  ----------
+  filename : file name
+  channel : the channel to be viewed, default is 0 (left)
+  """
+  def __init__(self,filename,channel=0):
+    with open(filename,'rb') as f:
+      (self.audio_format,self.n_channels,self.sampling_rate,
+       self.bits_per_sample,n_bytes) = wav_read_header(f)
+      self.data_start = f.tell()
+      self.map = mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ)
+    assert 0<=channel<self.n_channels, f'No channel {channel} in a {self.n_channels} channel(s) file'
+    self.channel = channel
+    self.bytes_per_sample = self.bits_per_sample//8
+    self.alignment = self.n_channels*self.bytes_per_sample
+    # truncated file : only complete frames are kept
+    n_bytes = min(n_bytes,len(self.map)-self.data_start)
+    # frames of the file
+    self.n_frames = n_bytes//self.alignment
+    self.ratio = self.sampling_rate/get_sampling_rate()
+    self.n_samples = self.n_frames if self.ratio==1 else int(self.n_frames/self.ratio)
+    self.channel_start = self.data_start+channel*self.bytes_per_sample
+    if self.audio_format==1:
+      self.scale = 1/2**(self.bits_per_sample-1)
+    else:
+      self.scale = 1.0
+    if self.audio_format==1 and self.bits_per_sample==24:
+      self.unpack_from = None
+    else:
+      code = {(1,16):'<h',(1,32):'<i',(3,32):'<f',(3,64):'<d'}[(self.audio_format,self.bits_per_sample)]
+      self.unpack_from = struct.Struct(code).unpack_from
+
+  def __len__(self):
+    return self.n_samples
+
+  def frames(self,start,stop,step=1):
+    """
+    Returns
+    -------
+    a compact sound, frames start, start+step... (before stop) of the file
+    """
+    n_frames = len(range(start,stop,step))
+    if n_frames==0:
+      return create_sound()
+    # every step-th frame : seen as a file with step times more channels
+    i_start = self.data_start+start*self.alignment
+    data = self.map[i_start:i_start+n_frames*step*self.alignment]
+    data += bytes(n_frames*step*self.alignment-len(data))
+    return wav_decode_samples(data,self.audio_format,self.bits_per_sample,
+                              self.n_channels*step,self.channel)
+
+  def resampled(self,indices):
+    """
+    Returns
+    -------
+    a compact sound, the file at frames i*ratio for i in indices
+    (see interpolate_at_samples)
+    """
+    samples = [i*self.ratio for i in indices]
+    if len(samples)==0:
+      return create_sound()
+    # frames around the samples (zeros outside of the file)
+    n_pad = 8
+    i_start = max(0,math.floor(min(samples))-n_pad)
+    i_stop = min(self.n_frames,math.ceil(max(samples))+n_pad)
+    frames = self.frames(i_start,max(i_start,i_stop))
+    return interpolate_at_samples(frames,[sample-i_start for sample in samples])
+
+  def __getitem__(self,index):
+    if isinstance(index,slice):
+      start,stop,step = index.indices(self.n_samples)
+      if self.ratio!=1:
+        return self.resampled(range(start,stop,step))
+      if step<0:
+        return as_sound(self[i] for i in range(start,stop,step))
+      return self.frames(start,stop,step)
+    if index<0:
+      index += self.n_samples
+    if index<0 or index>=self.n_samples:
+      raise IndexError('WavView index out of range')
+    if self.ratio!=1:
+      return self.resampled([index])[0]
+    i_byte = self.channel_start+index*self.alignment
+    if self.unpack_from is None:
+      sample = int.from_bytes(self.map[i_byte:i_byte+3],'little',signed=True)
+    else:
+      sample = self.unpack_from(self.map,i_byte)[0]
+    return sample*self.scale
+
+  def __iter__(self):
+    block_size = 4096
+    for i_start in range(0,self.n_samples,block_size):
+      yield from self[i_start:i_start+block_size]
+
+  def close(self):
+    self.map.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self,*args):
+    self.close()
+
+def open_wav(filename,channel=0):
+  """
+  Opens a WAV file without reading it (see WavView)
+  Returns
+  -------
+  a WavView (read-only sound decoded on demand)
+  """
+  return WavView(filename,channel)
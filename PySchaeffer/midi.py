@@ -1,4 +1,7 @@
-import struct
+import bisect,itertools,operator,struct
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from PySchaeffer.base import *
 # MIDI utils
 ############
 
@@ -19,32 +22,137 @@ def midi_track_messages_to_note_durations(track_messages,channel=0):
   ----------
   track_messages : a list of tuples
     (time,channel,message,key,value)
+  channel : the MIDI channel (0 to 15) to be processed,
+    or None to process all channels in one pass
 
   Returns
   -------
   a list of tuples
     (time,key,velocity,duration)
+  or, if channel is None, a list of 16 such lists (one per channel)
   """
-  notes = []
+  all_notes = [[] for _ in range(16)]
+  # open notes : for each (channel,key), stack of indices in notes
+  open_notes = {}
   for time,ch,message,key,value in track_messages:
-    if ch==channel:
-      if message==0x09 and value!=0: # real note on
-        notes.append((time,key,value,0))
-      elif message==0x08 or message==0x09: # note off or "fake" note on
-        i = len(notes)-1
-        found = False
-        while i>=0 and not found:
-          # same key with no duration
-          if notes[i][1]==key and notes[i][3]==0:
-            duration = time-notes[i][0]
-            time = notes[i][0]
-            value = notes[i][2]
-            notes[i] = (time,key,value,duration)
-            found = True
-          i -= 1
-        if i<0:
-          print('Warning : Note off without corresponding Note On...')
-  return notes
+    if channel is not None and ch!=channel:
+      continue
+    notes = all_notes[ch]
+    if message==0x09 and value!=0: # real note on
+      open_notes.setdefault((ch,key),[]).append(len(notes))
+      notes.append((time,key,value,0))
+    elif message==0x08 or message==0x09: # note off or "fake" note on
+      stack = open_notes.get((ch,key))
+      if stack:
+        # most recent same key with no duration
+        i = stack[-1]
+        start_time,_,velocity,_ = notes[i]
+        duration = time-start_time
+        notes[i] = (start_time,key,velocity,duration)
+        if duration!=0:
+          stack.pop()
+      else:
+        print('Warning : Note off without corresponding Note On...')
+  if channel is None:
+    return all_notes
+  return all_notes[channel]
+
+# MIDI RENDERING
+################
+
+class VoiceCache:
+  """
+  Bounded LRU cache of rendered voices
+  Parameters
+  ----------
+  instrument : a function (key,velocity,duration) -> list of float
+  max_size : max number of voices kept
+  """
+  def __init__(self,instrument,max_size=256):
+    self.instrument = instrument
+    self.max_size = max_size
+    self.voices = OrderedDict()
+
+  def __contains__(self,voice):
+    return voice in self.voices
+
+  def __len__(self):
+    return len(self.voices)
+
+  def add(self,voice,sound):
+    """
+    voice : a tuple (key,velocity,duration)
+    sound : the rendered voice
+    """
+    self.voices[voice] = sound
+    self.voices.move_to_end(voice)
+    if len(self.voices)>self.max_size:
+      self.voices.popitem(last=False)
+
+  def get(self,voice):
+    """
+    voice : a tuple (key,velocity,duration)
+    Returns the rendered voice (rendered by the instrument if not cached)
+    """
+    if voice in self.voices:
+      self.voices.move_to_end(voice)
+      return self.voices[voice]
+    sound = self.instrument(*voice)
+    self.add(voice,sound)
+    return sound
+
+def midi_quantize_note(key,velocity,duration,time_step=1,velocity_step=1):
+  """
+  Returns
+  -------
+  the voice tuple (key,velocity,duration) used as cache key
+  """
+  velocity = min(127,max(1,round(velocity/velocity_step)*velocity_step))
+  duration = round(duration/time_step)*time_step
+  return key,velocity,duration
+
+def midi_render(notes,instrument,time_step=1,velocity_step=1,cache=None,n_workers=None):
+  """
+  Renders notes with an instrument : identical voices (after quantization)
+  are rendered only once
+  Parameters
+  ----------
+  notes : a list of tuples (time,key,velocity,duration)
+    (see midi_track_messages_to_note_durations)
+  instrument : a function (key,velocity,duration) -> list of float
+  time_step : quantization of durations (in ms)
+  velocity_step : quantization of velocities
+  cache : a VoiceCache of the same instrument (to be shared between calls),
+    a new one (256 voices) if None
+  n_workers : if not None, distinct voices are rendered in parallel by
+    a pool of n_workers processes (0 : as many as CPUs).
+    The instrument should then be picklable (module level function).
+  Returns
+  -------
+  a list of float
+  """
+  if cache is None:
+    cache = VoiceCache(instrument)
+  voices = [midi_quantize_note(key,velocity,duration,time_step,velocity_step)
+            for _,key,velocity,duration in notes]
+  rendered = {}
+  if n_workers is not None:
+    missing = list(OrderedDict.fromkeys(voice for voice in voices if voice not in cache))
+    if len(missing)>0:
+      with ProcessPoolExecutor(n_workers or None) as pool:
+        sounds = pool.map(instrument,*zip(*missing))
+        for voice,sound in zip(missing,sounds):
+          # kept for this rendering even if evicted from the cache
+          rendered[voice] = sound
+          cache.add(voice,sound)
+  mixer = Mixer()
+  for (time,_,_,_),voice in zip(notes,voices):
+    if voice in rendered:
+      sound = rendered[voice]
+    else:
+      sound = cache.get(voice)
+    mixer.add(sound,time)
+  return mixer.render()
 
 # MIDI I/O
 ##########
@@ -58,70 +166,184 @@ def midi_vlq_read(file):
     is_pending = (byte>>7)==1
   return value
 
+def midi_vlq_parse(data,pos):
+  """
+  Parameters
+  ----------
+  data : bytes-like object
+  pos : position of the variable-length quantity in data
+  Returns
+  -------
+  a tuple (value,pos) where pos is the position following the quantity
+  """
+  value = 0
+  byte = 0x80
+  while byte&0x80:
+    byte = data[pos]
+    pos += 1
+    value = (value<<7)|(byte&127)
+  return value,pos
+
+def midi_tempo_map(tempo_events,tick_div):
+  """
+  Parameters
+  ----------
+  tempo_events : a list of tuples (tick,tempo)
+    tempo : in microseconds per quarter note (set tempo meta event 0x51)
+  tick_div : the division field of the MIDI header
+    bit 15 is 0 : ticks per quarter note
+    bit 15 is 1 : SMPTE (frames per second and ticks per frame)
+  Returns
+  -------
+  a list of tempo segments (start_tick,start_time,ms_per_tick)
+  sorted by start_tick (start_time in ms)
+  """
+  if tick_div&0x8000:
+    # SMPTE : tempo events are meaningless
+    frames_per_second = 256-(tick_div>>8)
+    if frames_per_second==29:
+      frames_per_second = 29.97 # drop frame
+    return [(0,0.0,1000/(frames_per_second*(tick_div&0xFF)))]
+  # default tempo : 120 BPM
+  tempo_map = [(0,0.0,500000/1000/tick_div)]
+  for tick,tempo in sorted(tempo_events):
+    last_tick,last_time,last_ms_per_tick = tempo_map[-1]
+    ms_per_tick = tempo/1000/tick_div
+    if tick==last_tick:
+      tempo_map[-1] = (last_tick,last_time,ms_per_tick)
+    else:
+      tempo_map.append((tick,last_time+(tick-last_tick)*last_ms_per_tick,ms_per_tick))
+  return tempo_map
+
+def midi_ticks_to_ms(ticks,tempo_map):
+  """
+  Parameters
+  ----------
+  ticks : a list of ticks in increasing order
+  tempo_map : see midi_tempo_map
+  Returns
+  -------
+  a list of times (in ms)
+  """
+  # one list comprehension per tempo segment
+  times = []
+  i_start = 0
+  for i_segment,(start_tick,start_time,ms_per_tick) in enumerate(tempo_map):
+    if i_segment+1<len(tempo_map):
+      i_end = bisect.bisect_left(ticks,tempo_map[i_segment+1][0],i_start)
+    else:
+      i_end = len(ticks)
+    times += [start_time+(tick-start_tick)*ms_per_tick for tick in ticks[i_start:i_end]]
+    i_start = i_end
+  return times
+
 def midi_read(filename):
-  # Known errors????
-  # - no tempo change
-  f = open(filename,'rb')
+  """
+  Reads a MIDI file (format 0 or 1)
+  Parameters
+  ----------
+  filename : file name
+  Returns
+  -------
+  a list of tracks, each one being a list of tuples
+    (time,channel,message,key,value)
+    time : in ms (tempo changes are taken into account)
+    message : 0x08 (note off), 0x09 (note on), 0x0A (aftertouch),
+      0x0B (control change), 0x0C (program change),
+      0x0D (channel pressure), 0x0E (pitch wheel)
+    key : -1 if not relevant for the message
+  """
+  # whole file in memory, payloads are skipped by length
+  with open(filename,'rb') as f:
+    data = f.read()
   #
-  assert 'MThd'==struct.unpack('>4s',f.read(4))[0].decode('UTF-8')
-  assert 6==struct.unpack('>I',f.read(4))[0] #chunklen=6
+  assert data[0:4]==b'MThd'
+  header_length = struct.unpack_from('>I',data,4)[0] # chunklen=6
   # Formats
   # 0 : single MTrk chunk
   # 1 : two or more simultaneous MTrk chunks
   # 2 : one or more non simultaneous MTrk chunks
-  format = struct.unpack('>H',f.read(2))[0]
-  n_tracks = struct.unpack('>H',f.read(2))[0]
-  tick_div = struct.unpack('>H',f.read(2))[0]
-  # TODO : interpret tick_div
-  tempo = 0.5 # 120 BPM
-  tracks = []
+  format,n_tracks,tick_div = struct.unpack_from('>HHH',data,8)
+  pos = 8+header_length
+  tempo_events = []
+  tracks_ticks = []
+  tracks_messages = []
   for i_track in range(n_tracks):
-    track_messages = []
-    time = 0
-    assert 'MTrk'==struct.unpack('>4s',f.read(4))[0].decode('UTF-8')
-    track_length = struct.unpack('>I',f.read(4))[0]
-    track_end = f.tell()+track_length
-    while f.tell()<track_end:
-      # dirty tempo hack
-      time = time+int(midi_vlq_read(f)/tempo)
-      status = struct.unpack('>B',f.read(1))[0]
-      if status==0xF0:
-        # SYSEX
-        message_length = midi_vlq_read(f)
-        for _ in range(message_length):
-          data = struct.unpack('>B',f.read(1))[0]
+    # one list per field, zipped once the times are known
+    ticks = []
+    statuses = []
+    keys = []
+    values = []
+    assert data[pos:pos+4]==b'MTrk'
+    track_length = struct.unpack_from('>I',data,pos+4)[0]
+    pos += 8
+    track_end = pos+track_length
+    tick = 0
+    running_status = None
+    while pos<track_end:
+      delta = data[pos]
+      pos += 1
+      if delta&0x80:
+        byte = data[pos]
+        if byte&0x80:
+          delta,pos = midi_vlq_parse(data,pos-1)
+        else:
+          # 2 byte quantity (most delta times above 127 ticks)
+          delta = ((delta&127)<<7)|byte
+          pos += 1
+      tick += delta
+      status = data[pos]
+      if status<0xF0:
+        if status&0x80:
+          pos += 1
+          running_status = status
+        else:
+          # running status : data byte, not consumed
+          assert running_status is not None,f'Unrecognized status byte : 0x{status:02X}'
+          status = running_status
+        if status<0xC0:
+          # Note Off, Note On, Aftertouch, Control Change
+          keys.append(data[pos])
+          values.append(data[pos+1])
+          pos += 2
+        elif status<0xE0:
+          # Program Change, Channel Pressure
+          keys.append(-1)
+          values.append(data[pos])
+          pos += 1
+        else:
+          # Pitch Wheel (LSB first)
+          keys.append(-1) # all
+          values.append(data[pos]|(data[pos+1]<<7))
+          pos += 2
+        ticks.append(tick)
+        statuses.append(status)
+      elif status==0xF0 or status==0xF7:
+        # SYSEX : skipped
+        message_length,pos = midi_vlq_parse(data,pos+1)
+        pos += message_length
       elif status==0xFF:
         # NON-MIDI
-        type = struct.unpack('>B',f.read(1))[0]
-        message_length = midi_vlq_read(f)
-        for _ in range(message_length):
-          data = struct.unpack('>B',f.read(1))[0]
+        type = data[pos+1]
+        message_length,pos = midi_vlq_parse(data,pos+2)
         if type==0x51:
-          ... # TEMPO
-        elif type==0x58:
-          ... # TIME SIGNATURE
+          # TEMPO (microseconds per quarter note, 24 bit)
+          tempo_events.append((tick,(data[pos]<<16)|(data[pos+1]<<8)|data[pos+2]))
+        elif type==0x2F:
+          # END OF TRACK
+          break
+        pos += message_length
       else:
-        if (status>>7)!=1:
-          status = running_status
-          f.seek(-1,1) # 1 means : from current pos
-        message = status>>4
-        if message in [0x08,0x09,0x0A,0x0B]:
-          # Note Off, Note On, Aftertouch, Control Change
-          key = struct.unpack('>B',f.read(1))[0]
-          value = struct.unpack('>B',f.read(1))[0]
-        elif message==0x0E:
-          # Pitch Wheel
-          key = -1 # all
-          value = (struct.unpack('>B',f.read(1))[0]<<7
-                  +struct.unpack('>B',f.read(1))[0])
-        elif message in [0x0C,0x0D]:
-          key = -1
-          value = struct.unpack('>B',f.read(1))
-        else:
-          assert False,f'Unrecognized status byte : 0x{status:02X}'
-        channel = status&15
-        track_messages.append((time,channel,message,key,value))
-      running_status = status
-    tracks.append(track_messages)
-  f.close()
+        assert False,f'Unrecognized status byte : 0x{status:02X}'
+    pos = track_end
+    tracks_ticks.append(ticks)
+    tracks_messages.append((statuses,keys,values))
+  # ticks to ms, once the whole tempo map is known
+  tempo_map = midi_tempo_map(tempo_events,tick_div)
+  tracks = []
+  for ticks,(statuses,keys,values) in zip(tracks_ticks,tracks_messages):
+    times = midi_ticks_to_ms(ticks,tempo_map)
+    channels = map(operator.and_,statuses,itertools.repeat(15))
+    messages = map(operator.rshift,statuses,itertools.repeat(4))
+    tracks.append(list(zip(times,channels,messages,keys,values)))
   return tracks
@@ -0,0 +1,115 @@
+#!/usr/bin/python3
+import math
+import numpy as np
+from PySchaeffer import base
+from PySchaeffer.base import get_sampling_rate
+
+# NUMPY IMPLEMENTATIONS
+#######################
+# Vectorized versions of hot functions (see PySchaeffer.backend) :
+# same names, same parameters, same results (up to rounding errors).
+
+def to_sound(values):
+  """
+  Returns a compact sound (see base.create_sound) from a NumPy array
+  """
+  sound = base.create_sound()
+  sound.frombytes(np.ascontiguousarray(values,dtype=np.dtype(base.sound_typecode)).tobytes())
+  return sound
+
+def generate_sine(duration,frequency):
+  sampling_rate = get_sampling_rate()
+  i = np.arange((duration*sampling_rate)//1000)
+  return to_sound(np.sin(2*math.pi*frequency*i/sampling_rate))
+
+def analyse_fft(a):
+  if len(a)==0:
+    return []
+  return np.fft.fft(np.asarray(a,dtype=complex)).tolist()
+
+def analyse_inverse_fft(A):
+  if len(A)==0:
+    return []
+  return np.fft.ifft(np.asarray(A,dtype=complex)).tolist()
+
+def analyse_rfft(x):
+  if len(x)==0:
+    return []
+  return np.fft.rfft(np.asarray(x,dtype=float)).tolist()
+
+def analyse_inverse_rfft(X,n=None):
+  if n is None:
+    n = 2*(len(X)-1)
+  if n<=0:
+    return []
+  return np.fft.irfft(np.asarray(X,dtype=complex),n).tolist()
+
+def fast_convolve(input_signal,ir_signal):
+  n_input_signal = len(input_signal)
+  n_ir_signal = len(ir_signal)
+  n_output_signal = n_input_signal+n_ir_signal
+  n_fft = 1<<max(0,n_output_signal-1).bit_length()
+  output_fft = (np.fft.rfft(np.asarray(input_signal,dtype=float),n_fft)
+               *np.fft.rfft(np.asarray(ir_signal,dtype=float),n_fft))
+  output_signal = np.zeros(n_output_signal)
+  output_signal[:n_output_signal-1] = np.fft.irfft(output_fft,n_fft)[:n_output_signal-1]
+  return to_sound(output_signal)
+
+def apply_all_pole_filter(v,a):
+  """
+  Recursive part y[n] = v[n]-a[1]*y[n-1]-...-a[Q]*y[n-Q], by blocks of L samples :
+  the output of a block is the response to its input with a null initial
+  state (a matrix product with the truncated impulse response, for all
+  blocks at once) plus the response to the last outputs of the previous
+  block (computed block after block).
+  """
+  n_samples = len(v)
+  order = len(a)-1
+  L = 256
+  # responses on L samples (pure Python, small) :
+  #   h : to an impulse (null initial state)
+  #   H[:,j] : to an initial state y[-j-1]=1 (null input)
+  def response(impulse,state):
+    y = list(state)+[0.0]*L
+    for n in range(order,order+L):
+      value = impulse if n==order else 0.0
+      for i in range(1,order+1):
+        value -= a[i]*y[n-i]
+      y[n] = value
+    return y[order:]
+  h = np.array(response(1.0,[0.0]*order))
+  H = np.array([response(0.0,[1.0 if k==order-1-j else 0.0 for k in range(order)])
+                for j in range(order)]).T
+  i,j = np.indices((L,L))
+  T = np.where(i>=j,h[np.abs(i-j)],0.0)
+  n_blocks = -(-n_samples//L)
+  V = np.zeros(n_blocks*L)
+  V[:n_samples] = v
+  Y = V.reshape(n_blocks,L)@T.T
+  state = np.zeros(order)
+  for k in range(n_blocks):
+    Y[k] += H@state
+    state = Y[k,-1:-order-1:-1]
+  return Y.reshape(-1)[:n_samples]
+
+def apply_iir_filter(sound_in,numerator,denominator=[1]):
+  """
+  Cascade of the sections of effects.design_sections (the same factoring
+  as the pure Python version, multiple poles included), each one being :
+    FIR part : a NumPy convolution.
+    Recursive part : see apply_all_pole_filter.
+  """
+  # effects imports the backend : imported on first use
+  from PySchaeffer.effects import design_sections
+  x = np.asarray(sound_in,dtype=float)
+  n_samples = len(x)
+  if n_samples==0:
+    return base.create_sound()
+  y = x
+  for b,a in design_sections(numerator,denominator):
+    y = np.convolve(y,b)[:n_samples]
+    while len(a)>1 and a[-1]==0:
+      a = a[:-1]
+    if len(a)>1:
+      y = apply_all_pole_filter(y,a)
+  return to_sound(y)
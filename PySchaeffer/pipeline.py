@@ -0,0 +1,179 @@
+#!/usr/bin/python3
+import itertools,operator
+from PySchaeffer.base import *
+
+# PROCESSING GRAPH
+##################
+# Effects are chained block by block, so that memory only depends on the
+# block size and not on the length of the sound.
+#   source : an iterable of blocks (sound_blocks, WavReader, read_wav_blocks,
+#     sample_blocks of a generator...)
+#   node : an object with a process(block) method returning a block
+#     (IIRFilter, FilterBank(...,is_mixed=True), mono Freeverb, Convolver,
+#     EnvelopeDetector...), and optionally a flush() method returning its tail
+#   sink : an object with a write(block) method (WavWriter, SoundSink...)
+# A Pipeline is itself a node, so that graphs can be nested.
+# Blocks are mono : nodes returning several blocks (an unmixed FilterBank,
+# a stereo Freeverb) raise a TypeError, their channels being processed by
+# separate pipelines.
+
+def sample_blocks(samples,block_size=4096):
+  """
+  Parameters :
+    samples : an iterable of float (e.g. a generator, possibly endless)
+    block_size : number of samples per block
+  Returns :
+    a generator of compact sounds (blocks of block_size samples,
+    the last one may be shorter)
+  """
+  samples = iter(samples)
+  while True:
+    block = as_sound(itertools.islice(samples,block_size))
+    if len(block)==0:
+      return
+    yield block
+
+def check_block(node,block):
+  """
+  Returns :
+    block, if it is a mono block
+  Raises :
+    TypeError if node returned several blocks (tuple or list of blocks)
+  """
+  if isinstance(block,tuple) or (isinstance(block,list) and len(block)>0
+                                 and not isinstance(block[0],(int,float))):
+    raise TypeError("{} returned several blocks, pipelines only carry mono"
+                    " blocks".format(type(node).__name__))
+  return block
+
+def process_node(node,block):
+  """
+  Returns :
+    the block processed by node
+  """
+  return check_block(node,node.process(block))
+
+def flush_node(node):
+  """
+  Returns :
+    the tail of node (empty if node has no flush method)
+  """
+  if hasattr(node,'flush'):
+    return check_block(node,node.flush())
+  return create_sound()
+
+class FunctionNode:
+  """
+  Stateless node applying a function to each block
+  (e.g. FunctionNode(lambda block:amplify(block,0.5)))
+  """
+  def __init__(self,function):
+    self.function = function
+
+  def process(self,block):
+    return self.function(block)
+
+class Gain:
+  """
+  Node multiplying each block by a gain
+  """
+  def __init__(self,gain):
+    self.gain = gain
+
+  def process(self,block):
+    return as_sound(map(self.gain.__mul__,block))
+
+class Pipeline:
+  """
+  Nodes in series
+  """
+  def __init__(self,nodes):
+    """
+    Parameters :
+      nodes : list of nodes, the output of each one feeding the next one
+    """
+    self.nodes = list(nodes)
+
+  def process(self,block):
+    for node in self.nodes:
+      block = process_node(node,block)
+    return block
+
+  def flush(self):
+    """
+    Returns :
+      the tails of the nodes, each tail going through the following nodes
+      before they are flushed in turn
+    """
+    tail = create_sound()
+    for node in self.nodes:
+      if len(tail)>0:
+        tail = as_sound(process_node(node,tail))
+      tail.extend(flush_node(node))
+    return tail
+
+class Parallel:
+  """
+  Nodes fed with the same blocks, their outputs being mixed
+  (e.g. dry/wet : Parallel([Gain(0.7),Freeverb()],[1.0,0.3]))
+  """
+  def __init__(self,nodes,gains=None):
+    """
+    Parameters :
+      nodes : list of nodes
+      gains : list of float, one per node (1.0 if None)
+    """
+    self.nodes = list(nodes)
+    if gains is None:
+      gains = [1.0]*len(self.nodes)
+    assert len(gains)==len(self.nodes)
+    self.gains = list(gains)
+
+  def mix(self,blocks):
+    mix = create_sound(max([len(block) for block in blocks],default=0))
+    for block,gain in zip(blocks,self.gains):
+      n = len(block)
+      mix[:n] = as_sound(map(operator.add,mix[:n],map(gain.__mul__,block)))
+    return mix
+
+  def process(self,block):
+    return self.mix([process_node(node,block) for node in self.nodes])
+
+  def flush(self):
+    return self.mix([flush_node(node) for node in self.nodes])
+
+class SoundSink:
+  """
+  Sink gathering the blocks into a compact sound
+  """
+  def __init__(self):
+    self.sound = create_sound()
+
+  def write(self,block):
+    self.sound.extend(as_sound(block))
+
+def run_pipeline(source,node,sink=None):
+  """
+  Pulls the blocks of source, pushes them through node, and writes them
+  into sink, followed by the tail of node
+  --
+  Parameters :
+    source : an iterable of blocks
+    node : a node (a Pipeline, a Freeverb...) or a list of nodes
+    sink : an object with a write method (WavWriter, SoundSink...),
+      a new SoundSink if None
+  Returns :
+    the sink
+  """
+  if isinstance(node,list):
+    node = Pipeline(node)
+  if sink is None:
+    sink = SoundSink()
+  for block in source:
+    block = process_node(node,block)
+    if len(block)>0:
+      sink.write(block)
+  tail = flush_node(node)
+  if len(tail)>0:
+    sink.write(tail)
+  return sink
@@ -0,0 +1,51 @@
+#!/usr/bin/python3
+# DCT-I/II/III for N = 64 ... 65536 : FFT based versions (analyse_dct_*)
+# against the former O(N^2) double loops, the latter being only run up to
+# max_direct_size (extrapolated as N^2 above)
+# usage : python3 benchmarks/dct.py [max_direct_size]
+import math,os,random,sys,time
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from PySchaeffer.analysis import *
+
+def direct_dct_1(x):
+  N = len(x)
+  return [x[0]/2+sum(x[n]*math.cos(math.pi/(N-1)*n*k) for n in range(1,N-1))
+          +(-1)**k*x[N-1]/2 for k in range(N)]
+
+def direct_dct_2(x):
+  N = len(x)
+  return [sum(x[n]*math.cos(math.pi/N*(n+1/2)*k) for n in range(N)) for k in range(N)]
+
+def direct_dct_3(x):
+  N = len(x)
+  return [x[0]/2+sum(x[n]*math.cos(math.pi/N*n*(k+1/2)) for n in range(1,N))
+          for k in range(N)]
+
+def measure(function,*args):
+  start = time.perf_counter()
+  result = function(*args)
+  return result,time.perf_counter()-start
+
+if __name__=='__main__':
+  max_direct_size = int(sys.argv[1]) if len(sys.argv)>1 else 4096
+  random.seed(0)
+  print(f'{"type":>4} {"N":>6} {"direct":>10} {"fast":>9} {"cached":>9} {"speedup":>9}')
+  for dct_type,direct,fast in [(1,direct_dct_1,analyse_dct_1),
+                               (2,direct_dct_2,analyse_dct_2),
+                               (3,direct_dct_3,analyse_dct_3)]:
+    t_direct = None
+    for N in [64,256,1024,4096,16384,65536]:
+      x = [random.uniform(-1,1) for _ in range(N)]
+      # first call computes the tables, second one reads them from the cache
+      X,t_fast = measure(fast,x)
+      _,t_cached = measure(fast,x)
+      if N<=max_direct_size:
+        reference,t_direct = measure(direct,x)
+        assert max(map(abs,map(float.__sub__,X,reference)))<1e-9*N
+        direct_time = f'{t_direct:9.3f}s'
+      else:
+        t_direct *= (N/N_direct)**2
+        direct_time = f'~{t_direct:8.1f}s'
+      N_direct = N
+      print(f'{dct_type:4} {N:6}',direct_time,f'{t_fast:8.4f}s',f'{t_cached:8.4f}s',
+            f'{t_direct/t_cached:8.0f}x')
@@ -0,0 +1,75 @@
+#!/usr/bin/python3
+# MIDI note pairing on 100k-event tracks : open notes indexed per key
+# (midi_track_messages_to_note_durations) against the former backward scan
+# of the whole note list for each note off
+# usage : python3 benchmarks/midi_note_pairing.py [n_events]
+import os,random,sys,time
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from PySchaeffer.midi import *
+
+def pair_notes_by_scan(track_messages,channel=0):
+  """
+  Reference : backward scan of the notes for each note off
+  """
+  notes = []
+  for time,ch,message,key,value in track_messages:
+    if ch==channel:
+      if message==0x09 and value!=0:
+        notes.append((time,key,value,0))
+      elif message==0x08 or message==0x09:
+        i = len(notes)-1
+        while i>=0:
+          if notes[i][1]==key and notes[i][3]==0:
+            notes[i] = (notes[i][0],key,notes[i][2],time-notes[i][0])
+            break
+          i -= 1
+  return notes
+
+def sustained_track(n_events):
+  """
+  All notes on, then all notes off (pedal held over a dense passage)
+  """
+  n_notes = n_events//2
+  return ([(i,0,0x09,21+i%88,64) for i in range(n_notes)]
+          +[(n_notes+i,0,0x08,21+i%88,0) for i in range(n_notes)])
+
+def dense_track(n_events,n_channels=1,seed=0):
+  """
+  Overlapping notes of random keys and lengths on n_channels channels
+  """
+  generator = random.Random(seed)
+  events = []
+  for i in range(n_events//2):
+    start = generator.randrange(10*n_events)
+    ch = generator.randrange(n_channels)
+    key = generator.randrange(21,109)
+    events.append((start,ch,0x09,key,generator.randrange(1,128)))
+    events.append((start+generator.randrange(1,2000),ch,0x08,key,0))
+  events.sort(key=lambda event:event[0])
+  return events
+
+def measure(function,*args):
+  start = time.perf_counter()
+  result = function(*args)
+  return result,time.perf_counter()-start
+
+if __name__=='__main__':
+  n_events = int(sys.argv[1]) if len(sys.argv)>1 else 100000
+  print(f'{n_events} events')
+  print(f'{"track":>22} {"scan":>9} {"indexed":>9} {"speedup":>8}')
+  for name,track in [('sustained',sustained_track(n_events)),
+                     ('dense',dense_track(n_events))]:
+    reference,t_reference = measure(pair_notes_by_scan,track)
+    notes,t_indexed = measure(midi_track_messages_to_note_durations,track)
+    assert notes==reference
+    print(name.rjust(22),f'{t_reference:8.3f}s',f'{t_indexed:8.3f}s',
+          f'{t_reference/t_indexed:7.1f}x')
+  # 16 channels : one call per channel against one pass
+  track = dense_track(n_events,16)
+  start = time.perf_counter()
+  references = [pair_notes_by_scan(track,ch) for ch in range(16)]
+  t_reference = time.perf_counter()-start
+  all_notes,t_indexed = measure(midi_track_messages_to_note_durations,track,None)
+  assert all_notes==references
+  print('16 channels, one pass'.rjust(22),f'{t_reference:8.3f}s',f'{t_indexed:8.3f}s',
+        f'{t_reference/t_indexed:7.1f}x')
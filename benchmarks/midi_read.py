@@ -0,0 +1,115 @@
+#!/usr/bin/python3
+# MIDI read throughput : midi_read (whole file in memory, payloads skipped by
+# length) against the former path (one file read per byte)
+# usage : python3 benchmarks/midi_read.py [n_tracks] [n_events_per_track]
+import os,random,struct,sys,tempfile,time
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from PySchaeffer.midi import *
+
+def midi_read_per_byte(filename):
+  """
+  Reference : one file read per byte (tempo events are ignored),
+  returns the same tuples as midi_read, without the time
+  """
+  with open(filename,'rb') as f:
+    assert f.read(4)==b'MThd'
+    header_length = struct.unpack('>I',f.read(4))[0]
+    format,n_tracks,tick_div = struct.unpack('>HHH',f.read(6))
+    f.seek(8+header_length)
+    tracks = []
+    for i_track in range(n_tracks):
+      track_messages = []
+      assert f.read(4)==b'MTrk'
+      track_length = struct.unpack('>I',f.read(4))[0]
+      track_end = f.tell()+track_length
+      running_status = None
+      while f.tell()<track_end:
+        midi_vlq_read(f)
+        status = struct.unpack('>B',f.read(1))[0]
+        if status==0xF0 or status==0xF7:
+          for _ in range(midi_vlq_read(f)):
+            struct.unpack('>B',f.read(1))
+        elif status==0xFF:
+          struct.unpack('>B',f.read(1))
+          for _ in range(midi_vlq_read(f)):
+            struct.unpack('>B',f.read(1))
+        else:
+          if status<0x80:
+            status = running_status
+            f.seek(-1,1)
+          running_status = status
+          message = status>>4
+          if message in [0x08,0x09,0x0A,0x0B]:
+            key = struct.unpack('>B',f.read(1))[0]
+            value = struct.unpack('>B',f.read(1))[0]
+          elif message==0x0E:
+            key = -1
+            value = struct.unpack('>B',f.read(1))[0]|(struct.unpack('>B',f.read(1))[0]<<7)
+          else:
+            key = -1
+            value = struct.unpack('>B',f.read(1))[0]
+          track_messages.append((status&15,message,key,value))
+      tracks.append(track_messages)
+  return tracks
+
+def vlq(value):
+  data = [value&127]
+  value >>= 7
+  while value:
+    data.append((value&127)|128)
+    value >>= 7
+  return bytes(reversed(data))
+
+def write_midi(filename,n_tracks,n_events):
+  """
+  Format 1 file : a tempo track and n_tracks random tracks
+  (channel messages with running status, sysex and text events)
+  """
+  chunks = []
+  events = [vlq(0)+b'\xff\x51\x03'+(500000).to_bytes(3,'big'),
+            vlq(96000)+b'\xff\x51\x03'+(400000).to_bytes(3,'big')]
+  for _ in range(n_tracks):
+    track_events = []
+    running_status = None
+    for _ in range(n_events):
+      status = (random.choice([0x08,0x09,0x09,0x0B,0x0C,0x0E])<<4)|random.randrange(16)
+      n_data = 1 if status>>4==0x0C else 2
+      data = bytes(random.randrange(128) for _ in range(n_data))
+      if status!=running_status:
+        data = bytes([status])+data
+        running_status = status
+      track_events.append(vlq(random.randrange(300))+data)
+      if random.random()<0.05:
+        track_events.append(vlq(0)+b'\xf0'+vlq(64)+bytes(63)+b'\xf7')
+        running_status = None
+      if random.random()<0.05:
+        track_events.append(vlq(0)+b'\xff\x01'+vlq(32)+bytes(32))
+        running_status = None
+    chunks.append(track_events)
+  chunks.insert(0,events)
+  with open(filename,'wb') as f:
+    f.write(b'MThd'+struct.pack('>IHHH',6,1,len(chunks),480))
+    for track_events in chunks:
+      body = b''.join(track_events)+vlq(0)+b'\xff\x2f\x00'
+      f.write(b'MTrk'+struct.pack('>I',len(body))+body)
+
+def measure(function,*args):
+  start = time.perf_counter()
+  result = function(*args)
+  return result,time.perf_counter()-start
+
+if __name__=='__main__':
+  n_tracks = int(sys.argv[1]) if len(sys.argv)>1 else 16
+  n_events = int(sys.argv[2]) if len(sys.argv)>2 else 20000
+  random.seed(0)
+  print(f'{n_tracks} tracks, {n_events} channel events per track')
+  with tempfile.TemporaryDirectory() as directory:
+    filename = os.path.join(directory,'benchmark.mid')
+    write_midi(filename,n_tracks,n_events)
+    reference,t_reference = measure(midi_read_per_byte,filename)
+    tracks,t_read = measure(midi_read,filename)
+    assert [[message[1:] for message in track] for track in tracks]==reference
+    n_messages = sum(map(len,tracks))
+    print(f'{"per byte":>10} {t_reference:8.3f}s {n_messages/t_reference/1e6:6.2f}M events/s')
+    print(f'{"midi_read":>10} {t_read:8.3f}s {n_messages/t_read/1e6:6.2f}M events/s')
+    print(f'{"speedup":>10} {t_reference/t_read:8.1f}x')
@@ -0,0 +1,33 @@
+#!/usr/bin/python3
+# Scaling of parallel_convolve with the number of processes :
+# speedup against fast_convolve (one process, same backend : the processes
+# convolve their segments with the selected backend) for n_workers = 2 ... cpu_count
+# usage : python3 benchmarks/parallel_convolve.py [input_duration_in_s] [ir_duration_in_s] [python|numpy]
+import operator,os,random,sys,time
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from PySchaeffer.effects import *
+from PySchaeffer.backend import set_backend
+
+def measure(function,*args):
+  start = time.perf_counter()
+  result = function(*args)
+  return result,time.perf_counter()-start
+
+if __name__=='__main__':
+  input_duration = float(sys.argv[1]) if len(sys.argv)>1 else 30
+  ir_duration = float(sys.argv[2]) if len(sys.argv)>2 else 2
+  backend = set_backend(sys.argv[3] if len(sys.argv)>3 else 'auto')
+  random.seed(0)
+  input_signal = as_sound(random.uniform(-1,1) for _ in range(int(input_duration*44100)))
+  ir_signal = as_sound(random.uniform(-1,1)*0.01 for _ in range(int(ir_duration*44100)))
+  n_cpus = os.cpu_count()
+  print(f'{input_duration}s input, {ir_duration}s IR, {n_cpus} CPUs, {backend} backend')
+  reference,t_reference = measure(fast_convolve,input_signal,ir_signal)
+  print(f'{"workers":>8} {"time":>9} {"speedup":>8} {"efficiency":>11}')
+  print('serial'.rjust(8),f'{t_reference:8.3f}s',f'{1:7.2f}x')
+  for n_workers in range(2,max(2,n_cpus)+1):
+    output,t_parallel = measure(parallel_convolve,input_signal,ir_signal,n_workers)
+    assert max(map(abs,map(operator.sub,output,reference)))<1e-9
+    speedup = t_reference/t_parallel
+    print(f'{n_workers:8}',f'{t_parallel:8.3f}s',f'{speedup:7.2f}x',
+          f'{speedup/n_workers:10.0%}')
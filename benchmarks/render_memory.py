@@ -0,0 +1,57 @@
+#!/usr/bin/python3
+# Peak memory (RSS) of a render : a sine through an ADSR envelope and a
+# gain, with the former list buffers (boxed floats) against compact sounds
+# (array('d') and array('f')), each render running in its own subprocess
+# with the pure Python backend (no NumPy temporaries)
+# usage : python3 benchmarks/render_memory.py [duration_in_min]
+import math,os,resource,subprocess,sys,time
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def peak_rss():
+  """
+  Returns : peak resident set size of this process (in MB)
+  """
+  max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  # kB on Linux, bytes on macOS
+  return max_rss/2**20 if sys.platform=='darwin' else max_rss/2**10
+
+def render(mode,duration):
+  """
+  Renders duration ms into a list of float if mode is 'list',
+  into a compact sound of typecode mode otherwise
+  """
+  from PySchaeffer import base
+  from PySchaeffer.generate import generate_sine
+  from PySchaeffer.effects import amplify,apply_adsr
+  sampling_rate = base.get_sampling_rate()
+  n_samples = int(duration*sampling_rate/1000)
+  if mode=='list':
+    # former generate_sine
+    sound = [math.sin(2*math.pi*440*i/sampling_rate) for i in range(n_samples)]
+  else:
+    base.sound_typecode = mode
+    sound = generate_sine(int(duration),440)
+  apply_adsr(sound,(50,100,0.7,500))
+  amplify(sound,0.5)
+  return len(sound)
+
+if __name__=='__main__':
+  if len(sys.argv)>2 and sys.argv[1]=='--child':
+    mode,duration = sys.argv[2],float(sys.argv[3])
+    import PySchaeffer.effects
+    rss_start = peak_rss()
+    start = time.perf_counter()
+    n_samples = render(mode,duration)
+    print(n_samples,rss_start,peak_rss(),time.perf_counter()-start)
+    sys.exit()
+  minutes = float(sys.argv[1]) if len(sys.argv)>1 else 10
+  print(f'{minutes} min render at 44100Hz')
+  print(f'{"buffers":>12} {"peak RSS":>10} {"render":>10} {"bytes/sample":>13} {"time":>8}')
+  for mode,name in [('list','list'),('d',"array('d')"),('f',"array('f')")]:
+    output = subprocess.run([sys.executable,os.path.abspath(__file__),'--child',mode,
+                             str(minutes*60000)],capture_output=True,text=True,check=True,
+                            env=dict(os.environ,PYSCHAEFFER_BACKEND='python'))
+    n_samples,rss_start,rss_peak,duration = output.stdout.split()
+    rss_start,rss_peak = float(rss_start),float(rss_peak)
+    print(name.rjust(12),f'{rss_peak:8.0f}MB',f'{rss_peak-rss_start:8.0f}MB',
+          f'{(rss_peak-rss_start)*2**20/int(n_samples):13.1f}',f'{float(duration):7.1f}s')
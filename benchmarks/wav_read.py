@@ -0,0 +1,53 @@
+#!/usr/bin/python3
+# WAV read throughput : bulk decoding (read_wav) against the former
+# per-sample struct.unpack path
+# usage : python3 benchmarks/wav_read.py [duration_in_s]
+import os,random,struct,sys,tempfile,time
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from PySchaeffer.io import *
+
+def read_wav_per_sample(filename,channel=0):
+  """
+  Reference : one struct.unpack per sample (PCM only)
+  """
+  with open(filename,'rb') as f:
+    _,n_channels,_,bits_per_sample,n_bytes = wav_read_header(f)
+    n_samples = n_bytes//(n_channels*bits_per_sample//8)
+    sound = [0]*n_samples
+    for i in range(n_samples):
+      for i_channel in range(n_channels):
+        if bits_per_sample==16:
+          sample = struct.unpack('<h',f.read(2))[0]
+        elif bits_per_sample==24:
+          b = f.read(3)
+          sample = struct.unpack('<i',b+(b'\0' if b[2]<128 else b'\xff'))[0]
+        else:
+          sample = struct.unpack('<l',f.read(4))[0]
+        if i_channel==channel:
+          sound[i] = sample/(2**(bits_per_sample-1))
+  return sound
+
+def measure(function,*args):
+  start = time.perf_counter()
+  result = function(*args)
+  return result,time.perf_counter()-start
+
+if __name__=='__main__':
+  duration = float(sys.argv[1]) if len(sys.argv)>1 else 10
+  n_samples = int(duration*44100)
+  random.seed(0)
+  sound = [random.uniform(-1,1) for _ in range(n_samples)]
+  print(f'{duration}s at 44100Hz ({n_samples} samples per channel)')
+  print(f'{"format":>16} {"per sample":>14} {"bulk":>14} {"speedup":>8}')
+  with tempfile.TemporaryDirectory() as directory:
+    filename = os.path.join(directory,'benchmark.wav')
+    for n_channels in [1,2]:
+      for bits_per_sample in [16,24,32]:
+        write_wav(filename,(sound,)*n_channels if n_channels>1 else sound,bits_per_sample)
+        reference,t_reference = measure(read_wav_per_sample,filename)
+        bulk,t_bulk = measure(read_wav,filename)
+        assert list(bulk)==reference
+        print(f'{n_channels}ch {bits_per_sample}bit'.rjust(16),
+              f'{n_samples/t_reference/1e6:9.2f}MS/s',
+              f'{n_samples/t_bulk/1e6:9.2f}MS/s',
+              f'{t_reference/t_bulk:7.1f}x')
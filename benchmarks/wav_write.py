@@ -0,0 +1,54 @@
+#!/usr/bin/python3
+# WAV write throughput : block quantization and packing (write_wav) against
+# the former one struct.pack and one write per sample (16 bit mono only)
+# (speedup in samples per second)
+# usage : python3 benchmarks/wav_write.py [duration_in_s]
+import os,random,struct,sys,tempfile,time
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from PySchaeffer.io import *
+
+def write_wav_per_sample(filename,sound):
+  """
+  Reference : 16 bit mono, one clamp, struct.pack and write per sample
+  """
+  n_samples = len(sound)
+  n_bytes = 2*n_samples
+  with open(filename,'wb') as f:
+    f.write(struct.pack('<4sL4s4sLHHLLHH4sL',b'RIFF',36+n_bytes,b'WAVE',
+                        b'fmt ',16,1,1,44100,2*44100,2,16,b'data',n_bytes))
+    min_value = -2**15
+    max_value = 2**15-1
+    for sample in sound:
+      q_sample = min(max_value,max(min_value,int(sample*2**15)))
+      f.write(struct.pack('<h',q_sample))
+
+def measure(function,*args):
+  start = time.perf_counter()
+  function(*args)
+  return time.perf_counter()-start
+
+if __name__=='__main__':
+  duration = float(sys.argv[1]) if len(sys.argv)>1 else 10
+  n_samples = int(duration*44100)
+  random.seed(0)
+  sound = [random.uniform(-1,1) for _ in range(n_samples)]
+  print(f'{duration}s at 44100Hz ({n_samples} samples per channel)')
+  print(f'{"format":>16} {"writes/s":>9} {"samples/s":>14} {"speedup":>8}')
+  with tempfile.TemporaryDirectory() as directory:
+    filename = os.path.join(directory,'benchmark.wav')
+    t_reference = measure(write_wav_per_sample,filename,sound)
+    with open(filename,'rb') as f:
+      reference = f.read()
+    print('per sample 16bit'.rjust(16),f'{1/t_reference:9.2f}',
+          f'{n_samples/t_reference/1e6:9.2f}MS/s',f'{1:7.1f}x')
+    for n_channels,bits_per_sample,is_float in [(1,16,False),(1,24,False),(1,32,True),
+                                                (2,16,False),(2,24,False),(2,32,True)]:
+      channels = (sound,)*n_channels if n_channels>1 else sound
+      t_block = measure(write_wav,filename,channels,bits_per_sample,is_float)
+      if (n_channels,bits_per_sample)==(1,16):
+        with open(filename,'rb') as f:
+          assert f.read()==reference
+      name = f'{n_channels}ch {bits_per_sample}bit'+(' float' if is_float else '')
+      print(name.rjust(16),f'{1/t_block:9.2f}',
+            f'{n_channels*n_samples/t_block/1e6:9.2f}MS/s',
+            f'{n_channels*t_reference/t_block:7.1f}x')
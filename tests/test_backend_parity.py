@@ -0,0 +1,95 @@
+import operator,random
+import pytest
+from PySchaeffer import backend
+from PySchaeffer.generate import *
+from PySchaeffer.analysis import *
+from PySchaeffer.effects import *
+from PySchaeffer.speech import design_formant_filters
+
+pytest.importorskip('numpy')
+
+@pytest.fixture(autouse=True)
+def numpy_backend():
+  previous = backend.get_backend()
+  backend.set_backend('numpy')
+  yield
+  backend.set_backend(previous)
+
+def noise(n,seed=0):
+  generator = random.Random(seed)
+  return [generator.uniform(-1,1) for _ in range(n)]
+
+def relative_error(values,reference):
+  assert len(values)==len(reference)
+  return max(map(abs,map(operator.sub,values,reference)))/max(map(abs,reference))
+
+def check_parity(function,args,tolerance):
+  assert relative_error(function(*args),function.python(*args))<tolerance
+
+def test_generate_sine():
+  check_parity(generate_sine,(1000,440),1e-12)
+
+# 10th order direct form (pure Python) against sections (NumPy) : rounding
+# errors of the direct form are amplified by the conditioning of the filter
+@pytest.mark.parametrize('vowel',['a','e','i','o','u'])
+def test_formant_filters(vowel):
+  check_parity(apply_iir_filter,(noise(20000),*design_formant_filters(vowel)),2e-7)
+
+def test_iir_filters():
+  check_parity(apply_iir_filter,(noise(20000),*design_low_pass(1000,0.7)),1e-10)
+  check_parity(apply_iir_filter,(noise(20000),[0.5,0.25]),1e-12)
+
+cascades = {
+  'low_pass_6th_order':[design_low_pass(2000,0.9)]*3,
+  'low_pass_high_pass':[design_low_pass(3000,0.7),design_high_pass(200,0.7)],
+  'high_pass_repeated':[design_high_pass(50,0.7)]*2,
+  'band_pass_repeated':[design_band_pass(500,10)]*4
+}
+
+@pytest.mark.parametrize('name',cascades)
+def test_iir_cascades(name):
+  # repeated poles : both backends factor (b,a) with design_sections,
+  # the reference being the biquads applied one after the other
+  signal = noise(20000)
+  reference = signal
+  b,a = [1.0],[1.0]
+  for b_i,a_i in cascades[name]:
+    reference = apply_iir_filter.python(reference,b_i,a_i)
+    b,a = multiply_polynomials(b,b_i),multiply_polynomials(a,a_i)
+  filtered = apply_iir_filter(signal,b,a)
+  assert relative_error(filtered,IIRFilter((b,a)).process(signal))<1e-10
+  assert relative_error(filtered,reference)<1e-6
+
+@pytest.mark.parametrize('function,args',[
+  (apply_iir_filter,([],[1.0,0.5],[1.0,0.2])),
+  (apply_iir_filter,([],*design_low_pass(1000,0.7))),
+  (analyse_fft,([],)),
+  (analyse_inverse_fft,([],)),
+  (analyse_rfft,([],)),
+  (analyse_inverse_rfft,([],)),
+  (fast_convolve,([],[1.0]))])
+def test_empty_input(function,args):
+  assert list(function(*args))==list(function.python(*args))
+
+@pytest.mark.parametrize('n',[1,2,16,1000,4096])
+def test_fft(n):
+  signal = noise(n)
+  check_parity(analyse_fft,(signal,),3e-14)
+  check_parity(analyse_inverse_fft,(analyse_fft.python(signal),),3e-14)
+
+@pytest.mark.parametrize('n',[2,16,1000,4096])
+def test_rfft(n):
+  signal = noise(n)
+  check_parity(analyse_rfft,(signal,),3e-14)
+  check_parity(analyse_inverse_rfft,(analyse_rfft.python(signal),n),3e-14)
+
+def test_fast_convolve():
+  check_parity(fast_convolve,(noise(5000),noise(300,1)),3e-14)
+
+def test_parallel_convolve():
+  # the processes convolve their segments with the backend of the caller
+  x = noise(20000)
+  h = noise(3000,1)
+  reference = fast_convolve.python(x,h)
+  for n_workers in (1,2):
+    assert relative_error(parallel_convolve(x,h,n_workers),reference)<1e-10
@@ -0,0 +1,32 @@
+import math,operator
+from PySchaeffer.effects import *
+
+def test_apply_envelope_not_in_place():
+  sound = [1.0]*1000
+  enveloped = apply_envelope(sound,[(0.0,1.0),(1.0,1.0)],False)
+  assert list(enveloped)==sound
+  assert sound==[1.0]*1000
+
+def test_apply_adsr_not_in_place():
+  sound = as_sound([1.0]*10000)
+  enveloped = apply_adsr(sound,(10,10,0.5,10),is_in_place=False)
+  assert max(enveloped)>0.9
+  assert min(sound)==1.0
+
+def test_apply_delay_automation_curve():
+  sound = as_sound([math.sin(i/10) for i in range(20000)])
+  curve = AutomationCurve([(0,1.0),(400,5.0)])
+  delayed = apply_delay(sound,curve)
+  assert len(delayed)==len(sound)
+  rendered = apply_delay(sound,curve.render(len(sound)*1000/get_sampling_rate()))
+  assert max(map(abs,map(operator.sub,delayed,rendered)))<1e-9
+
+def test_delay_line_curve_not_shared():
+  sound = as_sound([math.sin(i/10) for i in range(4000)])
+  curve = AutomationCurve([(0,1.0),(50,5.0)])
+  lines = [DelayLine(curve),DelayLine(curve)]
+  outputs = [line.process(sound) for line in lines]
+  assert curve.i_sample==0
+  assert list(outputs[0])==list(outputs[1])
+  lines[0].reset()
+  assert list(lines[0].process(sound))==list(outputs[0])
@@ -0,0 +1,47 @@
+import operator,random
+from PySchaeffer.effects import *
+
+def noise(n=4000,seed=0):
+  generator = random.Random(seed)
+  return [generator.uniform(-1,1) for _ in range(n)]
+
+def cascade(*designs):
+  b,a = [1.0],[1.0]
+  for b_i,a_i in designs:
+    b,a = multiply_polynomials(b,b_i),multiply_polynomials(a,a_i)
+  return b,a
+
+def relative_error(filtered,reference):
+  return max(map(abs,map(operator.sub,filtered,reference)))/max(map(abs,reference))
+
+def check_cascade(designs):
+  b,a = cascade(*designs)
+  signal = noise()
+  iir_filter = IIRFilter((b,a))
+  assert len(iir_filter.sections)==len(designs)
+  filtered = iir_filter.process(signal[:1500])+iir_filter.process(signal[1500:])
+  assert relative_error(filtered,apply_iir_filter.python(signal,b,a))<1e-8
+
+def test_low_pass_4th_order():
+  check_cascade([design_low_pass(1000,0.7)]*2)
+
+def test_low_pass_6th_order():
+  check_cascade([design_low_pass(2000,0.9)]*3)
+
+def test_low_pass_high_pass():
+  check_cascade([design_low_pass(3000,0.7),design_high_pass(200,0.7)])
+
+def test_band_pass_repeated():
+  check_cascade([design_band_pass(1000,2)]*3)
+
+def test_delayed_numerator():
+  b,a = cascade(*[design_low_pass(1000,0.7)]*2)
+  b = [0.0,0.0]+b
+  signal = noise()
+  assert relative_error(IIRFilter((b,a)).process(signal),apply_iir_filter.python(signal,b,a))<1e-8
+
+def test_direct_form_section():
+  b,a = cascade(*[design_low_pass(1000,0.7)]*2)
+  signal = noise()
+  iir_filter = IIRFilter([(b,a)])
+  assert relative_error(iir_filter.process(signal),apply_iir_filter.python(signal,b,a))<1e-8
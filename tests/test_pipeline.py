@@ -0,0 +1,19 @@
+import operator,pytest
+from PySchaeffer.effects import *
+from PySchaeffer.pipeline import *
+
+def test_mixed_filter_bank_in_pipeline():
+  sound = as_sound([((i*7919)%101)/50-1 for i in range(10000)])
+  filters = [design_low_pass(500,0.7),design_high_pass(2000,0.7)]
+  sink = run_pipeline(sound_blocks(sound,1000),[FilterBank(filters,is_mixed=True),Gain(0.5)])
+  expected = amplify(apply_filter_bank(sound,filters),0.5,False)
+  assert max(map(abs,map(operator.sub,sink.sound,expected)))<1e-12
+
+def test_unmixed_filter_bank_rejected():
+  bank = FilterBank([design_low_pass(500,0.7),design_high_pass(2000,0.7)])
+  with pytest.raises(TypeError):
+    run_pipeline(sound_blocks(create_sound(1000),100),[bank,Gain(0.5)])
+
+def test_stereo_freeverb_rejected():
+  with pytest.raises(TypeError):
+    run_pipeline(sound_blocks(create_sound(1000),100),Freeverb(stereo_spread=23))
@@ -0,0 +1,49 @@
+import math,random
+import pytest
+from PySchaeffer.base import *
+
+def sine(n_samples,frequency):
+  sampling_rate = get_sampling_rate()
+  return as_sound(math.sin(2*math.pi*frequency*i/sampling_rate) for i in range(n_samples))
+
+def noise(n_samples,seed=0):
+  generator = random.Random(seed)
+  return as_sound(generator.uniform(-1,1) for _ in range(n_samples))
+
+def exact_resample(sound,ratio):
+  return interpolate_at_samples(sound,[i*ratio for i in range(int(len(sound)/ratio))])
+
+def max_error(sound,reference):
+  assert len(sound)==len(reference)
+  return max(abs(x-y) for x,y in zip(sound,reference))
+
+@pytest.mark.parametrize('ratio',[1.5,0.5,2**(1/12),2**(-7/12),math.pi,3.0001234])
+def test_resample_speed(ratio):
+  # a sine read at speed ratio : frequency multiplied by ratio
+  sound = sine(3*get_sampling_rate(),100)
+  resampled = resample(sound,ratio)
+  assert len(resampled)==int(len(sound)/ratio)
+  n_samples = min(len(resampled),get_sampling_rate())
+  expected = sine(n_samples,100*ratio)
+  assert max(abs(x-y) for x,y in zip(resampled[:n_samples],expected))<1e-2
+
+def test_resample_exact_ratio():
+  sound = noise(5000)
+  assert max_error(resample(sound,1.5),exact_resample(sound,1.5))<1e-5
+
+@pytest.mark.parametrize('ratio',[2**(1/12),2**(-7/12)])
+def test_resample_long_signal(ratio):
+  # 20s : no drift, whatever the length
+  sound = sine(20*get_sampling_rate(),1000)
+  exact = exact_resample(sound,ratio)
+  assert max_error(resample(sound,ratio),exact)<1e-12
+  # position error at most tolerance/2 samples
+  tolerance = 1e-3
+  bound = 2*math.pi*1000/get_sampling_rate()*tolerance/2
+  assert max_error(resample(sound,ratio,tolerance=tolerance),exact)<1.5*bound
+
+def test_resample_tolerance_noise():
+  sound = noise(441000)
+  tolerance = 1e-3
+  error = max_error(resample(sound,2**(1/12),tolerance=tolerance),exact_resample(sound,2**(1/12)))
+  assert error<math.pi*tolerance/2+1e-5
@@ -0,0 +1,21 @@
+import random
+import pytest
+from PySchaeffer.analysis import *
+
+@pytest.mark.parametrize('n_fft,hop,window,window_size',[
+  (256,256,'rectangular',256),
+  (256,200,'rectangular',256),
+  (2048,512,'hann',None),
+  (512,128,'hann',300)])
+def test_stft_round_trip(n_fft,hop,window,window_size):
+  # 3001 : not a multiple of the hop
+  generator = random.Random(0)
+  sound = [generator.uniform(-1,1) for _ in range(3001)]
+  frames = list(analyse_stft(sound,n_fft,hop,window,window_size))
+  resynthesised = [sample for block in analyse_inverse_stft(frames,n_fft,hop,window,window_size)
+                   for sample in block]
+  assert len(resynthesised)>=len(sound)
+  assert max(abs(x-y) for x,y in zip(sound,resynthesised))<1e-12
+  trimmed = [sample for block in analyse_inverse_stft(frames,n_fft,hop,window,window_size,len(sound))
+             for sample in block]
+  assert len(trimmed)==len(sound)
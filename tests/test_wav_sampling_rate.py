@@ -0,0 +1,46 @@
+import math,os
+from PySchaeffer.base import *
+from PySchaeffer.generate import generate_sine
+from PySchaeffer.io import *
+
+def sine_file(directory,duration=1000,frequency=440):
+  filename = os.path.join(directory,'sine.wav')
+  write_wav(filename,generate_sine(duration,frequency),is_float=True,bits_per_sample=64)
+  return filename
+
+def max_error(sound,reference):
+  return max(abs(x-y) for x,y in zip(sound,reference))
+
+def test_read_in_draft_mode(tmp_path):
+  filename = sine_file(tmp_path)
+  with draft_mode(22050):
+    expected = generate_sine(1000,440)
+    sound = read_wav(filename)
+    assert len(sound)==len(expected)
+    assert max_error(sound[100:-100],expected[100:-100])<1e-4
+    with WavReader(filename,block_size=1000) as reader:
+      assert len(reader)==len(expected)
+      streamed = create_sound()
+      for block in reader:
+        streamed.extend(block)
+    assert len(streamed)==len(expected)
+    assert max_error(streamed,sound)<1e-4
+    with open_wav(filename) as view:
+      assert len(view)==len(expected)
+      assert max_error(view[1000:2000],sound[1000:2000])<1e-4
+      assert abs(view[1500]-sound[1500])<1e-4
+
+def test_write_in_draft_mode(tmp_path):
+  filename_wav = os.path.join(tmp_path,'write_wav.wav')
+  filename_blocks = os.path.join(tmp_path,'write_wav_blocks.wav')
+  with draft_mode(22050):
+    sound = generate_sine(1000,440)
+    write_wav(filename_wav,sound,is_float=True,bits_per_sample=64)
+    write_wav_blocks(filename_blocks,sound_blocks(sound,1000),is_float=True,bits_per_sample=64)
+  with WavReader(filename_wav) as reader:
+    assert reader.sampling_rate==44100
+  with WavReader(filename_blocks) as reader:
+    assert reader.sampling_rate==44100
+  written,written_blocks = read_wav(filename_wav),read_wav(filename_blocks)
+  assert len(written)==len(written_blocks)==44100
+  assert max_error(written_blocks[100:-100],written[100:-100])<1e-4